@@ -0,0 +1,388 @@
+#!/usr/bin/env python
+"""
+Benchmarks the synchronization and the API endpoints without Neo4j.
+
+The customers in demo_csv/customers.csv are repeated, with fresh ids and
+company names, up to ``--rows`` rows and synchronized through the same
+controller the ``synchronize`` command uses. The FastAPI app is then called
+in process through its ASGI interface, with the middleware, caching and
+encoding it runs in production, against a stand-in database client that
+sleeps ``--latency`` seconds per call (see benchmarks/standin.py).
+
+For every endpoint the run reports throughput, p50/p99 latency, the time
+spent encoding response bodies and the peak RSS of the process so far.
+Results can be saved with ``--save`` and compared with a saved run through
+``--compare``; the exit status is 1 when an endpoint regressed by more than
+``--tolerance``. It is 1 as well when a repeated unpaged listing of a
+reference label, which the default cache TTLs cover, reaches the database
+more than once.
+
+Usage: python benchmarks/bench_api.py [--rows 100000] [--requests 200]
+           [--concurrency 8] [--latency 0.001] [--save run.json]
+           [--compare baseline.json]
+"""
+
+import argparse
+import asyncio
+import csv
+import importlib
+import json
+import math
+import platform
+import resource
+import sys
+import time
+from typing import Callable
+from typing import Dict
+from typing import Iterator
+from typing import List
+from typing import Optional
+from typing import Tuple
+from urllib.parse import urlsplit
+
+sys.path.append(".")
+
+from src.app.api.api import app
+from src.app.infrastructure import responses
+from src.app.infrastructure.controllers import CLIController
+from src.app.infrastructure.controllers import LifecycleController
+from src.app.infrastructure.databases import AbstractBaseDBClient
+from src.app.infrastructure.versions import InMemoryVersionStore
+
+DEMO_CSV = "demo_csv/customers.csv"
+DEFAULT_BACKEND = "benchmarks.standin.StandInDBClient"
+
+# (name, path, most requests per run); scans of the whole label are capped
+# so that large datasets finish in reasonable time.
+ENDPOINTS: Tuple[Tuple[str, str, Optional[int]], ...] = (
+    ("customers_page", "/customers?limit=100", None),
+    ("customers_all", "/customers", 5),
+    ("customer_by_id", "/customer/customerID/eq/ALFKI", None),
+    ("customers_by_country", "/customer/country/eq/Germany", 20),
+    ("customers_filter", "/customers/filter?country=Germany&city=Berlin", 20),
+    ("customers_search", "/customers/search?q=maria", 20),
+    ("customers_per_country", "/customers/per-country", None),
+    ("countries", "/countries", None),
+    ("graph_view_page", "/graph-view?limit=100", None),
+    ("customer_neighbors", "/customers/neighbors?customerID=ALFKI&depth=2", None),
+    ("shortest_path", "/customers/shortest-path?source=ALFKI&target=BLAUS", None),
+)
+
+# Unpaged listings the default cache TTLs should keep from reaching the
+# database again when they are repeated.
+CACHED_PATHS = ("/countries", "/cities", "/companies")
+
+# Figures compared between runs, and whether higher is better.
+COMPARED = (("throughput", True), ("p50_ms", False), ("p99_ms", False))
+
+
+def scaled_rows(path: str, count: int) -> Iterator[Dict]:
+    """
+    Yields ``count`` customers built from the demo file; every repetition of
+    the file gets its own ids and companies but keeps the cities and
+    countries, so groups grow with the dataset.
+    """
+    with open(path, newline="") as csv_file:
+        base = list(csv.DictReader(csv_file))
+    for i in range(count):
+        generation, row = divmod(i, len(base))
+        row = dict(base[row])
+        if generation:
+            row["customerID"] = f"{row['customerID']}{generation:06d}"
+            row["companyName"] = f"{row['companyName']} {generation}"
+        yield row
+
+
+def load_backend(path: str, latency: float, jitter: float) -> AbstractBaseDBClient:
+    module_name, _, class_name = path.rpartition(".")
+    backend = getattr(importlib.import_module(module_name), class_name)
+    return backend(latency=latency, jitter=jitter)
+
+
+class BenchCLIController(CLIController):
+
+    def __init__(self, database: AbstractBaseDBClient, versions: InMemoryVersionStore):
+        super().__init__()
+        self._bench_database = database
+        self._versions = versions
+
+    def _create_database(self) -> AbstractBaseDBClient:  # type: ignore
+        return self._bench_database
+
+
+class BenchLifecycleController(LifecycleController):
+
+    def __init__(self, database: AbstractBaseDBClient, versions: InMemoryVersionStore):
+        super().__init__()
+        self._bench_database = database
+        self._versions = versions
+
+    def _create_database(self) -> AbstractBaseDBClient:  # type: ignore
+        return self._bench_database
+
+
+def peak_rss_mb() -> float:
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Bytes on macOS, kilobytes elsewhere.
+    return peak / 1e6 if sys.platform == "darwin" else peak / 1e3
+
+
+def percentile(values: List[float], share: float) -> float:
+    ordered = sorted(values)
+    if not ordered:
+        return 0.0
+    # Nearest rank.
+    return ordered[max(0, math.ceil(share * len(ordered)) - 1)]
+
+
+class EncodingTimer:
+    """
+    Adds up the time spent in the response encoder while it is installed.
+    """
+
+    def __init__(self):
+        self.seconds = 0.0
+        self._dumps: Optional[Callable] = None
+
+    def _timed(self, content):
+        started = time.perf_counter()
+        try:
+            return self._dumps(content)  # type: ignore
+        finally:
+            self.seconds += time.perf_counter() - started
+
+    def __enter__(self):
+        self._dumps = responses.dumps
+        responses.dumps = self._timed
+        return self
+
+    def __exit__(self, *exc_info):
+        responses.dumps = self._dumps
+
+
+async def call(path: str, headers: List[Tuple[bytes, bytes]] = ()) -> Tuple[int, int]:
+    """
+    Sends one GET through the app's ASGI interface; returns the status and
+    the body size.
+    """
+    url = urlsplit(path)
+    scope = {
+        "type": "http",
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "method": "GET",
+        "scheme": "http",
+        "path": url.path,
+        "raw_path": url.path.encode(),
+        "query_string": url.query.encode(),
+        "root_path": "",
+        "headers": [(b"host", b"bench")] + list(headers),
+        "client": ("127.0.0.1", 0),
+        "server": ("bench", 80),
+    }
+    status = 0
+    size = 0
+    requested = False
+    finished = asyncio.Event()
+
+    async def receive():
+        # The body comes first; after that the client only goes away once
+        # the response is complete, as streamed responses wait for it.
+        nonlocal requested
+        if not requested:
+            requested = True
+            return {"type": "http.request", "body": b"", "more_body": False}
+        await finished.wait()
+        return {"type": "http.disconnect"}
+
+    async def send(message):
+        nonlocal status, size
+        if message["type"] == "http.response.start":
+            status = message["status"]
+        elif message["type"] == "http.response.body":
+            size += len(message.get("body", b""))
+            if not message.get("more_body", False):
+                finished.set()
+
+    await app(scope, receive, send)
+    return status, size
+
+
+async def bench_sync(database: AbstractBaseDBClient,
+                     versions: InMemoryVersionStore,
+                     rows: int,
+                     batch_size: int) -> Dict:
+    controller = BenchCLIController(database, versions)
+    started = time.perf_counter()
+    await controller.synchronize(scaled_rows(DEMO_CSV, rows), batch_size=batch_size)
+    elapsed = time.perf_counter() - started
+    return {
+        "rows": rows,
+        "seconds": round(elapsed, 3),
+        "rows_per_second": round(rows / elapsed, 1) if elapsed else 0.0,
+        "peak_rss_mb": round(peak_rss_mb(), 1),
+    }
+
+
+async def bench_endpoint(path: str, requests: int, concurrency: int, headers) -> Dict:
+    latencies: List[float] = []
+    sizes: List[int] = []
+    errors = 0
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one():
+        nonlocal errors
+        async with semaphore:
+            started = time.perf_counter()
+            status, size = await call(path, headers)
+            latencies.append(time.perf_counter() - started)
+            sizes.append(size)
+            if status >= 400:
+                errors += 1
+
+    with EncodingTimer() as encoding:
+        started = time.perf_counter()
+        await asyncio.gather(*(one() for _ in range(requests)))
+        elapsed = time.perf_counter() - started
+    return {
+        "requests": requests,
+        "errors": errors,
+        "throughput": round(requests / elapsed, 1) if elapsed else 0.0,
+        "p50_ms": round(percentile(latencies, 0.5) * 1e3, 3),
+        "p99_ms": round(percentile(latencies, 0.99) * 1e3, 3),
+        "encode_ms": round(encoding.seconds / requests * 1e3, 3),
+        "body_kb": round(sum(sizes) / len(sizes) / 1e3, 1),
+        "peak_rss_mb": round(peak_rss_mb(), 1),
+    }
+
+
+async def check_round_trips(database: AbstractBaseDBClient, paths, repeat: int = 3) -> List[str]:
+    """
+    Calls every path ``repeat`` times in a row and returns the ones that
+    reached the database more than once. Backends that don't count their
+    round trips are not checked.
+    """
+    if not hasattr(database, "round_trips"):
+        return []
+    failures = []
+    for path in paths:
+        before = database.round_trips
+        for _ in range(repeat):
+            await call(path)
+        trips = database.round_trips - before
+        if trips > 1:
+            failures.append(f"{path} reached the database {trips} times in {repeat} calls")
+    return failures
+
+
+async def run(args) -> Dict:
+    database = load_backend(args.backend, args.latency, args.jitter)
+    versions = InMemoryVersionStore()
+    results: Dict = {
+        "meta": {
+            "rows": args.rows,
+            "latency": args.latency,
+            "jitter": args.jitter,
+            "concurrency": args.concurrency,
+            "backend": args.backend,
+            "python": platform.python_version(),
+        },
+        "sync": await bench_sync(database, versions, args.rows, args.batch_size),
+        "endpoints": {},
+    }
+
+    lifecycle = BenchLifecycleController(database, versions)
+    app.state.database = await lifecycle.startup()
+    app.state.versions = lifecycle.versions
+    app.state.flights = lifecycle.flights
+    headers = [(b"accept-encoding", args.encoding.encode())] if args.encoding else []
+    selected = set(args.endpoints.split(",")) if args.endpoints else None
+    for name, path, cap in ENDPOINTS:
+        if selected is not None and name not in selected:
+            continue
+        requests = min(args.requests, cap) if cap else args.requests
+        for _ in range(args.warmup):
+            await call(path, headers)
+        results["endpoints"][name] = await bench_endpoint(path, requests, args.concurrency, headers)
+    results["uncached"] = await check_round_trips(database, CACHED_PATHS)
+    return results
+
+
+def print_results(results: Dict):
+    sync = results["sync"]
+    print(f"sync: {sync['rows']} rows in {sync['seconds']}s "
+          f"({sync['rows_per_second']} rows/s, peak RSS {sync['peak_rss_mb']} MB)")
+    print(f"{'endpoint':<24}{'req/s':>10}{'p50 ms':>10}{'p99 ms':>10}"
+          f"{'encode ms':>11}{'body KB':>10}{'RSS MB':>9}{'errors':>8}")
+    for name, row in results["endpoints"].items():
+        print(f"{name:<24}{row['throughput']:>10}{row['p50_ms']:>10}{row['p99_ms']:>10}"
+              f"{row['encode_ms']:>11}{row['body_kb']:>10}{row['peak_rss_mb']:>9}{row['errors']:>8}")
+
+
+def compare(results: Dict, baseline: Dict, tolerance: float) -> List[str]:
+    """
+    Prints the relative change of every compared figure and returns the
+    regressions larger than ``tolerance``.
+    """
+    if baseline.get("meta") != results.get("meta"):
+        print("warning: the baseline was recorded with different settings")
+    regressions = []
+    print(f"{'endpoint':<24}" + "".join(f"{figure:>14}" for figure, _ in COMPARED))
+    for name, row in results["endpoints"].items():
+        before = baseline.get("endpoints", {}).get(name)
+        if before is None:
+            continue
+        cells = []
+        for figure, higher_is_better in COMPARED:
+            old, new = before[figure], row[figure]
+            change = (new - old) / old if old else 0.0
+            worse = -change if higher_is_better else change
+            if worse > tolerance:
+                regressions.append(f"{name} {figure} {old} -> {new}")
+            cells.append(f"{change:>+13.1%}{'!' if worse > tolerance else ' '}")
+        print(f"{name:<24}" + "".join(cells))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the API against a stand-in database.")
+    parser.add_argument("--rows", type=int, default=100000)
+    parser.add_argument("--batch-size", type=int, default=1000)
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--warmup", type=int, default=1)
+    parser.add_argument("--latency", type=float, default=0.001,
+                        help="Seconds slept per database call.")
+    parser.add_argument("--jitter", type=float, default=0.0,
+                        help="Up to this many more seconds, at random, per call.")
+    parser.add_argument("--backend", default=DEFAULT_BACKEND,
+                        help="Dotted path of the database client class to benchmark against.")
+    parser.add_argument("--encoding", default="",
+                        help="Accept-Encoding sent with every request, e.g. gzip.")
+    parser.add_argument("--endpoints", default="",
+                        help="Comma separated endpoint names; all by default.")
+    parser.add_argument("--save", help="Write the results to this JSON file.")
+    parser.add_argument("--compare", help="Compare with the results in this JSON file.")
+    parser.add_argument("--tolerance", type=float, default=0.1,
+                        help="Relative change counted as a regression.")
+    args = parser.parse_args()
+
+    results = asyncio.get_event_loop().run_until_complete(run(args))
+    print_results(results)
+    if results["uncached"]:
+        print("uncached:\n  " + "\n  ".join(results["uncached"]))
+
+    if args.save:
+        with open(args.save, "w") as results_file:
+            json.dump(results, results_file, indent=2)
+    if args.compare:
+        with open(args.compare) as baseline_file:
+            regressions = compare(results, json.load(baseline_file), args.tolerance)
+        if regressions:
+            print("regressions:\n  " + "\n  ".join(regressions))
+            return 1
+    return 1 if results["uncached"] else 0
+
+
+if __name__ == "__main__":
+    exit(main())
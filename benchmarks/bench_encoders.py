@@ -0,0 +1,108 @@
+#!/usr/bin/env python
+"""
+Compares the JSON rendering paths for a list of records holding one node each:
+
+* legacy  - the original ``ResponseEncoder`` with a per-object ``default()``
+* convert - ``to_primitive`` followed by the standard library encoder
+* orjson  - ``to_primitive`` followed by orjson, when it is installed
+
+Usage: python benchmarks/bench_encoders.py [--nodes 100000] [--repeat 3]
+"""
+
+import argparse
+import json
+import sys
+import time
+
+sys.path.append(".")
+
+from neo4j.data import Record
+from neo4j.graph import Graph
+from neo4j.graph import Node
+
+from src.app.infrastructure import encoders
+
+
+class LegacyResponseEncoder(json.JSONEncoder):
+    def default(self, instance):
+        if issubclass(instance.__class__, Node):
+            data = {k: instance[k] for k in instance.keys()}
+            return data
+        return str(instance)
+
+
+def legacy_dumps(content):
+    return json.dumps(
+        content,
+        cls=LegacyResponseEncoder,
+        ensure_ascii=False,
+        allow_nan=False,
+        indent=None,
+        separators=(",", ":"),
+    ).encode("utf-8")
+
+
+def convert_dumps(content):
+    return encoders._json_encoder.encode(encoders.to_primitive(content)).encode("utf-8")
+
+
+def orjson_dumps(content):
+    return encoders.orjson.dumps(encoders.to_primitive(content), default=encoders._json_encoder.default)
+
+
+def make_records(count: int):
+    graph = Graph()
+    records = []
+    for i in range(count):
+        node = Node(graph, i, {"Customer"}, {
+            "customerID": f"C{i:07d}",
+            "companyName": f"Company {i % 1000}",
+            "contactName": f"Contact {i}",
+            "contactTitle": "Sales Representative",
+            "address": f"Street {i}",
+            "city": f"City {i % 500}",
+            "region": "NULL",
+            "postalCode": f"{10000 + i % 90000}",
+            "country": f"Country {i % 50}",
+            "phone": "030-0074321",
+            "fax": "030-0076545",
+        })
+        records.append(Record([("c", node)]))
+    return records
+
+
+def measure(func, content, repeat: int):
+    best = None
+    size = 0
+    for _ in range(repeat):
+        started = time.perf_counter()
+        size = len(func(content))
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return best, size
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark JSON response encoders.")
+    parser.add_argument("--nodes", type=int, default=100000)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    records = make_records(args.nodes)
+    renderers = [("legacy", legacy_dumps), ("convert", convert_dumps)]
+    if encoders.orjson is not None:
+        renderers.append(("orjson", orjson_dumps))
+
+    baseline = None
+    print(f"{'renderer':<10}{'seconds':>10}{'nodes/s':>14}{'MB':>8}{'speedup':>9}")
+    for name, func in renderers:
+        elapsed, size = measure(func, records, args.repeat)
+        baseline = baseline or elapsed
+        print(
+            f"{name:<10}{elapsed:>10.3f}{args.nodes / elapsed:>14,.0f}"
+            f"{size / 1e6:>8.1f}{baseline / elapsed:>8.1f}x"
+        )
+
+
+if __name__ == "__main__":
+    exit(main())
@@ -0,0 +1,93 @@
+#!/usr/bin/env python
+"""
+Compares the memory held per customer by the shapes a list response can
+keep alive until it is encoded:
+
+* record  - a driver ``Record`` holding a ``Node`` with a property dict
+* entity  - a slotted ``CustomerEntity`` mapped from that node
+
+Property values are built once up front and shared by both shapes, so the
+figures are the per-object overhead on top of the data itself. The mapping
+time from records to entities is reported as well.
+
+Usage: python benchmarks/bench_entities.py [--customers 1000000]
+"""
+
+import argparse
+import gc
+import sys
+import time
+import tracemalloc
+
+sys.path.append(".")
+
+from neo4j.data import Record
+from neo4j.graph import Graph
+from neo4j.graph import Node
+
+from src.app.core.entities import CustomerEntity
+
+
+def make_properties(count: int):
+    return [
+        {
+            "customerID": f"C{i:07d}",
+            "companyName": f"Company {i % 1000}",
+            "contactName": f"Contact {i}",
+            "contactTitle": "Sales Representative",
+            "address": f"Street {i}",
+            "city": f"City {i % 500}",
+            "region": "NULL",
+            "postalCode": f"{10000 + i % 90000}",
+            "country": f"Country {i % 50}",
+            "phone": "030-0074321",
+            "fax": "030-0076545",
+        }
+        for i in range(count)
+    ]
+
+
+def make_records(properties):
+    graph = Graph()
+    return [
+        Record([("n", Node(graph, i, {"Customer"}, dict(props)))])
+        for i, props in enumerate(properties)
+    ]
+
+
+def make_entities(records):
+    from_properties = CustomerEntity.from_properties
+    return [from_properties(record[0]) for record in records]
+
+
+def measure(func, *args):
+    gc.collect()
+    tracemalloc.start()
+    started = time.perf_counter()
+    result = func(*args)
+    elapsed = time.perf_counter() - started
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, size, elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark entity memory footprint.")
+    parser.add_argument("--customers", type=int, default=1000000)
+    args = parser.parse_args()
+
+    properties = make_properties(args.customers)
+    records, records_size, records_time = measure(make_records, properties)
+    entities, entities_size, entities_time = measure(make_entities, records)
+
+    print(f"{'shape':<8}{'MB':>10}{'bytes/obj':>11}{'seconds':>10}")
+    for name, size, elapsed in (
+        ("record", records_size, records_time),
+        ("entity", entities_size, entities_time),
+    ):
+        print(f"{name:<8}{size / 1e6:>10.1f}{size / args.customers:>11.0f}{elapsed:>10.2f}")
+    print(f"entities use {records_size / entities_size:.1f}x less memory than records")
+
+
+if __name__ == "__main__":
+    exit(main())
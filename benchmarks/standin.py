@@ -0,0 +1,28 @@
+"""
+Stand-in for Neo4j used by the benchmarks, so that the API and the
+synchronization can be measured without a database: the in-memory graph
+backend, with a simulated round trip on every call.
+"""
+
+import asyncio
+import random
+
+from src.app.infrastructure.memory import InMemoryGraphDBClient
+
+
+class StandInDBClient(InMemoryGraphDBClient):
+    """
+    ``latency`` seconds, plus up to ``jitter`` more, are slept on every call
+    to stand for the network and the server, and counted in ``round_trips``.
+    """
+
+    def __init__(self, latency: float = 0.0, jitter: float = 0.0):
+        super().__init__()
+        self._latency = latency
+        self._jitter = jitter
+        self.round_trips = 0
+
+    async def _round_trip(self):
+        self.round_trips += 1
+        delay = self._latency + (random.uniform(0, self._jitter) if self._jitter else 0)
+        await asyncio.sleep(delay)
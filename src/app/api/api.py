@@ -1,10 +1,99 @@
+from functools import wraps
+
 from fastapi import FastAPI
 from fastapi.responses import JSONResponse
+from fastapi.responses import Response
 
 from .responses import JsonResponse
+from .responses import NotModifiedResponse
+from .responses import PageJsonResponse
+from .responses import page_response
 from src.app.infrastructure.controllers import APIController
+from src.app.infrastructure.controllers import LifecycleController
+from src.app.infrastructure.compression import CompressionMiddleware
+from src.app.infrastructure.exceptions import QueryTimeoutException
+from src.app.infrastructure.exceptions import ValidationException
+from src.app.infrastructure.metrics import CONTENT_TYPE as METRICS_CONTENT_TYPE
+from src.app.infrastructure.metrics import MetricsMiddleware
+from src.app.infrastructure.responses import ETAG_HEADER
+from src.app.infrastructure.singleflight import SingleFlight
+
+GRAPH_LABELS = ("Customer", "City", "Country", "Company")
 
 app = FastAPI()
+lifecycle = LifecycleController()
+app.add_middleware(CompressionMiddleware, minimum_size=lifecycle.compression_minimum_size)
+app.add_middleware(MetricsMiddleware)
+response_flights = SingleFlight("response") if lifecycle.coalesce else None
+
+
+@app.on_event("startup")
+async def startup():
+    app.state.database = await lifecycle.startup()
+    app.state.versions = lifecycle.versions
+    app.state.flights = lifecycle.flights
+
+
+@app.on_event("shutdown")
+async def shutdown():
+    await lifecycle.shutdown()
+
+
+@app.exception_handler(ValidationException)
+async def validation_exception_handler(request, exc):
+    return JSONResponse({"message": str(exc)}, status_code=400)
+
+
+async def shared_response(key: str, handler, request):
+    """
+    Runs the handler once for identical concurrent requests, ``key`` standing
+    for everything the body depends on, and gives each of them a copy of the
+    rendered response. A streamed body can only be sent once, so a request
+    that joined a streamed response runs the handler itself.
+    """
+    if response_flights is None:
+        return await handler(request)
+    leader = []
+
+    async def render():
+        leader.append(request)
+        return await handler(request)
+
+    response = await response_flights.do(key, render)
+    if not hasattr(response, "body"):
+        return response if leader else await handler(request)
+    shared = Response(response.body, status_code=response.status_code)
+    shared.raw_headers = list(response.raw_headers)
+    return shared
+
+
+def conditional(*labels: str):
+    """
+    Tags GET responses with an ETag built from the data versions of
+    ``labels`` and answers a matching If-None-Match with 304 before the
+    handler runs. Identical requests in flight at the same time share one
+    response, the ETag being the key.
+    """
+    def decorator(handler):
+        @wraps(handler)
+        async def wrapper(request):
+            if request.method != "GET":
+                return await handler(request)
+            controller = APIController(request)
+            etag = await controller.etag(*labels)
+            if controller.not_modified(etag):
+                return NotModifiedResponse(etag)
+            response = await shared_response(etag, handler, request)
+            if response.status_code == 200:
+                response.headers[ETAG_HEADER] = etag
+            return response
+        return wrapper
+    return decorator
+
+
+@app.exception_handler(QueryTimeoutException)
+async def query_timeout_exception_handler(request, exc):
+    return JSONResponse({"message": str(exc)}, status_code=504)
 
 
 @app.route("/", methods=["GET"])
@@ -14,14 +103,85 @@ async def home(request):
     )
 
 
+@app.route("/metrics", methods=["GET"])
+async def metrics(request):
+    controller = APIController(request)
+    return Response(controller.metrics(), media_type=METRICS_CONTENT_TYPE)
+
+
 @app.route("/customers", methods=["GET"])
+@conditional("Customer")
 async def all_customers(request):
     controller = APIController(request)
-    data = await controller.list_customers()
+    page = await controller.list_customers()
+    return page_response(page, controller.wants_ndjson)
+
+
+@app.route("/customers/batch", methods=["POST"])
+async def batch_customers(request):
+    controller = APIController(request)
+    data = await controller.batch_customers()
+    return JsonResponse(content=data)
+
+
+@app.route("/customers/filter", methods=["GET", "POST"])
+@conditional("Customer")
+async def compound_filter_customers(request):
+    controller = APIController(request)
+    data = await controller.filter_customers()
+    return JsonResponse(content=data)
+
+
+@app.route("/customers/search", methods=["GET"])
+@conditional("Customer")
+async def search_customers(request):
+    controller = APIController(request)
+    data = await controller.search_customers()
+    return JsonResponse(content=data)
+
+
+@app.route("/customers/neighbors", methods=["GET"])
+@conditional(*GRAPH_LABELS)
+async def customer_neighbors(request):
+    controller = APIController(request)
+    data = await controller.customer_neighbors()
+    return JsonResponse(content=data)
+
+
+@app.route("/customers/shortest-path", methods=["GET"])
+@conditional(*GRAPH_LABELS)
+async def shortest_path(request):
+    controller = APIController(request)
+    data = await controller.shortest_path()
+    return JsonResponse(content=data)
+
+
+@app.route("/customers/per-country", methods=["GET"])
+@conditional("Country")
+async def customers_per_country(request):
+    controller = APIController(request)
+    data = await controller.customers_per_country()
+    return JsonResponse(content=data)
+
+
+@app.route("/customers/per-city", methods=["GET"])
+@conditional("City")
+async def customers_per_city(request):
+    controller = APIController(request)
+    data = await controller.customers_per_city()
+    return JsonResponse(content=data)
+
+
+@app.route("/customers/per-company", methods=["GET"])
+@conditional("Company")
+async def customers_per_company(request):
+    controller = APIController(request)
+    data = await controller.customers_per_company()
     return JsonResponse(content=data)
 
 
 @app.route("/customer/{key}/{condition}/{value}", methods=["GET"])
+@conditional("Customer")
 async def filter_customer(request):
     controller = APIController(request)
     data = await controller.get_customer(**request.path_params)
@@ -29,13 +189,38 @@ async def filter_customer(request):
 
 
 @app.route("/companies", methods=["GET"])
+@conditional("Company")
 async def all_companies(request):
     controller = APIController(request)
-    data = await controller.list_companies()
+    page = await controller.list_companies()
+    return page_response(page, controller.wants_ndjson)
+
+
+@app.route("/companies/batch", methods=["POST"])
+async def batch_companies(request):
+    controller = APIController(request)
+    data = await controller.batch_companies()
+    return JsonResponse(content=data)
+
+
+@app.route("/companies/neighbors", methods=["GET"])
+@conditional(*GRAPH_LABELS)
+async def company_neighbors(request):
+    controller = APIController(request)
+    data = await controller.company_neighbors()
+    return JsonResponse(content=data)
+
+
+@app.route("/companies/filter", methods=["GET", "POST"])
+@conditional("Company")
+async def compound_filter_companies(request):
+    controller = APIController(request)
+    data = await controller.filter_companies()
     return JsonResponse(content=data)
 
 
 @app.route("/companies/{key}/{condition}/{value}", methods=["GET"])
+@conditional("Company")
 async def filter_companies(request):
     controller = APIController(request)
     data = await controller.get_companies(**request.path_params)
@@ -43,13 +228,38 @@ async def filter_companies(request):
 
 
 @app.route("/countries", methods=["GET"])
+@conditional("Country")
 async def all_countries(request):
     controller = APIController(request)
-    data = await controller.list_countries()
+    page = await controller.list_countries()
+    return page_response(page, controller.wants_ndjson)
+
+
+@app.route("/countries/batch", methods=["POST"])
+async def batch_countries(request):
+    controller = APIController(request)
+    data = await controller.batch_countries()
+    return JsonResponse(content=data)
+
+
+@app.route("/countries/neighbors", methods=["GET"])
+@conditional(*GRAPH_LABELS)
+async def country_neighbors(request):
+    controller = APIController(request)
+    data = await controller.country_neighbors()
+    return JsonResponse(content=data)
+
+
+@app.route("/countries/filter", methods=["GET", "POST"])
+@conditional("Country")
+async def compound_filter_countries(request):
+    controller = APIController(request)
+    data = await controller.filter_countries()
     return JsonResponse(content=data)
 
 
 @app.route("/countries/{key}/{condition}/{value}", methods=["GET"])
+@conditional("Country")
 async def filter_countries(request):
     controller = APIController(request)
     data = await controller.get_countries(**request.path_params)
@@ -57,13 +267,38 @@ async def filter_countries(request):
 
 
 @app.route("/cities", methods=["GET"])
+@conditional("City")
 async def all_cities(request):
     controller = APIController(request)
-    data = await controller.list_cities()
+    page = await controller.list_cities()
+    return page_response(page, controller.wants_ndjson)
+
+
+@app.route("/cities/batch", methods=["POST"])
+async def batch_cities(request):
+    controller = APIController(request)
+    data = await controller.batch_cities()
+    return JsonResponse(content=data)
+
+
+@app.route("/cities/neighbors", methods=["GET"])
+@conditional(*GRAPH_LABELS)
+async def city_neighbors(request):
+    controller = APIController(request)
+    data = await controller.city_neighbors()
+    return JsonResponse(content=data)
+
+
+@app.route("/cities/filter", methods=["GET", "POST"])
+@conditional("City")
+async def compound_filter_cities(request):
+    controller = APIController(request)
+    data = await controller.filter_cities()
     return JsonResponse(content=data)
 
 
 @app.route("/cities/{key}/{condition}/{value}", methods=["GET"])
+@conditional("City")
 async def filter_cities(request):
     controller = APIController(request)
     data = await controller.get_cities(**request.path_params)
@@ -71,7 +306,8 @@ async def filter_cities(request):
 
 
 @app.route("/graph-view", methods=["GET"])
+@conditional(*GRAPH_LABELS)
 async def show_graph(request):
     controller = APIController(request)
-    data = await controller.get_graph_view()
-    return JsonResponse(content=data)
+    page = await controller.get_graph_view()
+    return PageJsonResponse(page)
@@ -1,5 +1,21 @@
 from src.app.infrastructure.responses import JsonResponse as BaseJsonResponse
+from src.app.infrastructure.responses import NotModifiedResponse as BaseNotModifiedResponse
+from src.app.infrastructure.responses import PageJsonResponse as BasePageJsonResponse
+from src.app.infrastructure.responses import StreamingJsonResponse as BaseStreamingJsonResponse
+from src.app.infrastructure.responses import page_response  # noqa: F401
 
 
 class JsonResponse(BaseJsonResponse):
     pass
+
+
+class NotModifiedResponse(BaseNotModifiedResponse):
+    pass
+
+
+class PageJsonResponse(BasePageJsonResponse):
+    pass
+
+
+class StreamingJsonResponse(BaseStreamingJsonResponse):
+    pass
@@ -7,14 +7,19 @@ import sys
 
 sys.path.append(".")
 
+from src.app.core.usecases import DEFAULT_BATCH_SIZE
 from src.app.infrastructure.controllers import CLIController
 
 COMMAND_SYNCHRONIZE = "synchronize"
 COMMAND_NEW_USER = "add_user"
+COMMAND_CREATE_SCHEMA = "create_schema"
+COMMAND_REBUILD_COUNTS = "rebuild_counts"
 
 HELP_TEXT = f"""
 To create a user `{COMMAND_NEW_USER}`.
 To synchronize data `{COMMAND_SYNCHRONIZE}`.
+To create constraints and indexes `{COMMAND_CREATE_SCHEMA}`.
+To recompute the customer counts of countries, cities and companies `{COMMAND_REBUILD_COUNTS}`.
 """
 
 
@@ -49,17 +54,25 @@ def create_user():
     }
 
 
+def positive_int(value):
+    try:
+        number = int(value)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"invalid int value: {value!r}")
+    if number < 1:
+        raise argparse.ArgumentTypeError(f"must be at least 1, got {number}")
+    return number
+
+
 def read_csv(path):
-    data = []
     with open(path, newline='') as csv_file:
         reader = csv.DictReader(csv_file)
         for row in reader:
-            data.append(row)
-    return data
+            yield row
 
 
 def main():
-    commands = (COMMAND_SYNCHRONIZE, COMMAND_NEW_USER,)
+    commands = (COMMAND_SYNCHRONIZE, COMMAND_NEW_USER, COMMAND_CREATE_SCHEMA, COMMAND_REBUILD_COUNTS,)
     parser = argparse.ArgumentParser(
         description="Enter command to execute.", usage=", ".join(commands)
     )
@@ -67,6 +80,15 @@ def main():
         "action", metavar="action", type=str, choices=commands, help=HELP_TEXT
     )
     parser.add_argument('path', nargs='?', default=".")
+    parser.add_argument(
+        "--batch-size", type=positive_int, default=DEFAULT_BATCH_SIZE,
+        help="Number of rows sent to the database per write when synchronizing."
+    )
+    parser.add_argument(
+        "--delta", action="store_true",
+        help="Only write rows that changed since the last synchronization and "
+             "delete customers missing from the file."
+    )
 
     args = parser.parse_args()
 
@@ -77,12 +99,22 @@ def main():
     if handler_name == COMMAND_NEW_USER:
         data = create_user()
         loop.run_until_complete(controller.create_user(data))
+        controller.close()
         loop.close()
     elif handler_name == COMMAND_SYNCHRONIZE:
         csv_file_path = args.path
         data = read_csv(csv_file_path)
 
-        loop.run_until_complete(controller.synchronize(data))
+        loop.run_until_complete(controller.synchronize(data, batch_size=args.batch_size, delta=args.delta))
+        controller.close()
+        loop.close()
+    elif handler_name == COMMAND_CREATE_SCHEMA:
+        loop.run_until_complete(controller.create_schema())
+        controller.close()
+        loop.close()
+    elif handler_name == COMMAND_REBUILD_COUNTS:
+        loop.run_until_complete(controller.rebuild_counts())
+        controller.close()
         loop.close()
     else:
         help_text()
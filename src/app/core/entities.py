@@ -1,7 +1,13 @@
 from abc import ABCMeta
+from typing import Any
+from typing import Dict
+from typing import Mapping
+from typing import Tuple
 
 
 class BaseEntity(metaclass=ABCMeta):
+    __slots__ = ("_uuid",)
+
     def __init__(self, uuid=None):
         self._uuid = uuid
 
@@ -13,6 +19,9 @@ class BaseEntity(metaclass=ABCMeta):
     def uuid(self, uuid):
         self._uuid = uuid
 
+    def serialize(self) -> Dict[str, Any]:
+        return {"uuid": self._uuid}
+
 
 class ItemEntity(BaseEntity, metaclass=ABCMeta):
     def __init__(self, uuid=None, val=None):
@@ -33,34 +42,115 @@ class EnvItemEntity(ItemEntity):
     pass
 
 
-class LocationEntity(BaseEntity):
+class NodeEntity(BaseEntity):
+    """
+    Graph node with a fixed set of properties kept in slots, so that an
+    entity costs a small fixed size instead of a dict. ``FIELDS`` collects
+    the slots of the class and its bases and ``uuid`` is the node key.
+    """
+
+    __slots__ = ()
+
+    FIELDS: Tuple[str, ...] = ()
+    KEYS: Tuple[str, ...] = ()
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        fields = []
+        for klass in reversed(cls.__mro__):
+            if issubclass(klass, NodeEntity):
+                fields.extend(klass.__dict__.get("__slots__", ()))
+        cls.FIELDS = tuple(fields)
 
-    def __init__(self, uuid: str = None, country: str = None):
+    def __init__(self, uuid=None, **properties):
         super().__init__(uuid)
-        self._country = country
+        for field in self.FIELDS:
+            setattr(self, field, properties.get(field))
+
+    @classmethod
+    def from_properties(cls, properties: Mapping) -> "NodeEntity":
+        entity = cls.__new__(cls)
+        entity._uuid = None
+        get = properties.get
+        for field in cls.FIELDS:
+            setattr(entity, field, get(field))
+        return entity
+
+    @property
+    def uuid(self):
+        if self._uuid is None and self.KEYS:
+            values = tuple(getattr(self, key) for key in self.KEYS)
+            return values[0] if len(values) == 1 else values
+        return self._uuid
+
+    @uuid.setter
+    def uuid(self, uuid):
+        self._uuid = uuid
+
+    def serialize(self) -> Dict[str, Any]:
+        return {field: getattr(self, field) for field in self.FIELDS}
+
+    def __repr__(self):
+        return f"{self.__class__.__name__}(uuid={self.uuid!r})"
+
+
+class LocationEntity(NodeEntity):
+    __slots__ = ("name",)
+
+    KEYS = ("name",)
+
+
+class CountryEntity(LocationEntity):
+    __slots__ = ("customerCount",)
 
     @property
     def country(self):
-        return self._country
+        return self.name
 
     @country.setter
     def country(self, country: str):
-        self._country = country
+        self.name = country
 
 
-class CompanyEntity(BaseEntity):
-    def __init__(self, uuid: str = None, company: str = None):
-        super().__init__(uuid)
-        self._company = company
+class CityEntity(LocationEntity):
+    __slots__ = ("country", "customerCount")
+
+    KEYS = ("name", "country")
+
+
+class CompanyEntity(NodeEntity):
+    __slots__ = ("name", "customerCount")
+
+    KEYS = ("name",)
 
     @property
     def company(self):
-        return self._company
+        return self.name
 
     @company.setter
-    def country(self, company: str):
-        self._company = company
+    def company(self, company: str):
+        self.name = company
 
 
-class CustomerEntity(BaseEntity):
-    pass
+class CustomerEntity(NodeEntity):
+    __slots__ = (
+        "customerID", "companyName", "contactName", "contactTitle", "address", "city",
+        "region", "postalCode", "country", "phone", "fax",
+    )
+
+    KEYS = ("customerID",)
+
+
+class PageEntity(BaseEntity):
+    def __init__(self, items: list = None, cursor: str = None):
+        super().__init__()
+        self._items = items or []
+        self._cursor = cursor
+
+    @property
+    def items(self):
+        return self._items
+
+    @property
+    def cursor(self):
+        return self._cursor
@@ -1,5 +1,6 @@
 from abc import ABCMeta
 from abc import abstractmethod
+from typing import List
 
 
 class BaseReadOnlyRepository(metaclass=ABCMeta):
@@ -12,6 +13,24 @@ class BaseReadOnlyRepository(metaclass=ABCMeta):
     def filter(self, key: str, condition: str, value: str):
         raise NotImplementedError
 
+    def filter_by(self, expression: dict):
+        raise NotImplementedError
+
+    def get_many(self, ids: list):
+        raise NotImplementedError
+
+    def search(self, text: str, limit: int, mode: str):
+        raise NotImplementedError
+
+    def get_property_map(self, key: str):
+        raise NotImplementedError
+
+    def get_counts(self, counted: str, limit: int = None):
+        raise NotImplementedError
+
+    def neighbors(self, key, depth: int, fanout: int, limit: int, timeout: float = None):
+        raise NotImplementedError
+
 
 class BaseManageableRepository(BaseReadOnlyRepository, metaclass=ABCMeta):
 
@@ -24,6 +43,10 @@ class BaseManageableRepository(BaseReadOnlyRepository, metaclass=ABCMeta):
     def insert(self, data: dict):
         raise NotImplementedError
 
+    @abstractmethod
+    def insert_many(self, data: List[dict]):
+        raise NotImplementedError
+
     @abstractmethod
     def update(self, uuid: str, data: dict):
         raise NotImplementedError
@@ -31,3 +54,9 @@ class BaseManageableRepository(BaseReadOnlyRepository, metaclass=ABCMeta):
     @abstractmethod
     def delete(self, uuid: str):
         raise NotImplementedError
+
+    def delete_many(self, ids: List):
+        raise NotImplementedError
+
+    def rebuild_counts(self):
+        raise NotImplementedError
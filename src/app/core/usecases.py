@@ -1,11 +1,32 @@
+import hashlib
+import json
 from abc import ABCMeta
 from abc import abstractmethod
-from collections import namedtuple
+from itertools import islice
 from typing import Dict
+from typing import Iterable
+from typing import Iterator
 from typing import List
 
 from src.app.core.repositories import BaseManageableRepository
 
+DEFAULT_BATCH_SIZE = 1000
+SYNC_HASH = "syncHash"
+
+
+def row_hash(row: Dict) -> str:
+    content = {key: value for key, value in row.items() if key != SYNC_HASH}
+    data = json.dumps(content, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha1(data.encode("utf-8")).hexdigest()
+
+
+def batched(items: Iterable, size: int) -> Iterator[List]:
+    iterator = iter(items)
+    chunk = list(islice(iterator, size))
+    while chunk:
+        yield chunk
+        chunk = list(islice(iterator, size))
+
 
 class BaseUseCase(metaclass=ABCMeta):
 
@@ -26,70 +47,139 @@ class GetCustomerUseCase(BaseUseCase):
         return data
 
 
+class FilterNodesUseCase(BaseUseCase):
+    def __init__(self, expression: Dict, repo: BaseManageableRepository):
+        self._expression = expression
+        self._repo = repo
+
+    async def execute(self):
+        data = await self._repo.filter_by(self._expression)
+        return data
+
+
+class SearchNodesUseCase(BaseUseCase):
+    def __init__(self, text: str, limit: int, mode: str, repo: BaseManageableRepository):
+        self._text = text
+        self._limit = limit
+        self._mode = mode
+        self._repo = repo
+
+    async def execute(self):
+        data = await self._repo.search(self._text, self._limit, self._mode)
+        return data
+
+
+class GetManyNodesUseCase(BaseUseCase):
+    def __init__(self, ids: List, repo: BaseManageableRepository):
+        self._ids = ids
+        self._repo = repo
+
+    async def execute(self):
+        data = await self._repo.get_many(self._ids)
+        return data
+
+
 class ListCustomersUseCase(BaseUseCase):
-    def __init__(self, customers_repo: BaseManageableRepository):
+    def __init__(self,
+                 customers_repo: BaseManageableRepository,
+                 limit: int = None,
+                 cursor: str = None,
+                 stream: bool = False):
         self._customers_repo = customers_repo
+        self._limit = limit
+        self._cursor = cursor
+        self._stream = stream
 
     async def execute(self):
-        data = await self._customers_repo.get_all()
+        data = await self._customers_repo.get_all(self._limit, self._cursor, self._stream)
         return data
 
 
 class SynchronizeUseCase(BaseUseCase):
+    """
+    Writes the customers and the countries, cities and companies they refer
+    to. Each batch write also merges the edges of the rows it holds, so
+    cities are linked to their country and customers to their city and
+    company without a pass over the whole graph, and moves the customer
+    counts of the groups a row enters or leaves. In delta mode, rows whose
+    content hash matches the one stored on the customer are skipped and
+    customers missing from the input are deleted.
+    """
+
     def __init__(self,
-                 data: List[Dict],
+                 data: Iterable[Dict],
                  customers_repo: BaseManageableRepository,
                  countries_repo: BaseManageableRepository,
                  cities_repo: BaseManageableRepository,
-                 companies_repo: BaseManageableRepository,):
+                 companies_repo: BaseManageableRepository,
+                 batch_size: int = DEFAULT_BATCH_SIZE,
+                 delta: bool = False):
+        if batch_size < 1:
+            raise ValueError(f"Batch size must be at least 1, got {batch_size}")
         self._data = data
+        self._batch_size = batch_size
+        self._delta = delta
         self._customers_repo = customers_repo
         self._countries_repo = countries_repo
         self._cities_repo = cities_repo
         self._companies_repo = companies_repo
 
     async def execute(self):
+        await self._customers_repo.db.create_schema()
+
+        existing = None
+        if self._delta:
+            existing = await self._customers_repo.get_property_map(SYNC_HASH)
+
         countries = set()
         cities = set()
         companies = set()
-        for customer in self._data:
-            Country = namedtuple("Country", ["name"])
-            City = namedtuple("City", ["name", "country"])
-            Company = namedtuple("Company", ["name"])
-
-            countries.add(Country(name=customer["country"]))
-            cities.add(City(name=customer["city"], country=customer["country"]))
-            companies.add(Company(name=customer["companyName"]))
-
-        await self.sync_data(self.convert_set_nt_to_list_dict(countries), self._countries_repo)
-        await self.sync_data(self.convert_set_nt_to_list_dict(cities), self._cities_repo)
-        await self.sync_data(self.convert_set_nt_to_list_dict(companies), self._companies_repo)
-        await self.sync_data(self._data, self._customers_repo)
-
-        await self.create_relations()
-
-    def convert_set_nt_to_list_dict(self, set_of_nt):
-        data = []
-        for item in set_of_nt:
-            item_dict = {}
-            for field in item._fields:
-                item_dict[field] = getattr(item, field, None)
-            data.append(item_dict)
-        return data
-
-    async def sync_data(self, items: List[Dict], repo: BaseManageableRepository):
-        for item in items:
-            await repo.insert(item)
-
-    async def create_relations(self):
-        await self._cities_repo.db.create_relation(
-            "city", "located_in", "country", {"key": "country", "condition": "=", "value": "name"})
+        for chunk in batched(self._data, self._batch_size):
+            new_countries = []
+            new_cities = []
+            new_companies = []
+            changed = []
+            for customer in chunk:
+                customer = {**customer, SYNC_HASH: row_hash(customer)}
+                if existing is not None:
+                    if existing.pop(customer["customerID"], None) == customer[SYNC_HASH]:
+                        continue
+                changed.append(customer)
+
+                country = customer["country"]
+                city = (customer["city"], country)
+                company = customer["companyName"]
+
+                if country not in countries:
+                    countries.add(country)
+                    new_countries.append({"name": country})
+                if city not in cities:
+                    cities.add(city)
+                    new_cities.append({"name": city[0], "country": city[1]})
+                if company not in companies:
+                    companies.add(company)
+                    new_companies.append({"name": company})
+
+            await self.sync_data(new_countries, self._countries_repo)
+            await self.sync_data(new_cities, self._cities_repo)
+            await self.sync_data(new_companies, self._companies_repo)
+            await self.sync_data(changed, self._customers_repo)
+
+        if existing is not None:
+            for deleted in batched(existing, self._batch_size):
+                await self._customers_repo.delete_many(deleted)
+
+    async def sync_data(self, items: Iterable[Dict], repo: BaseManageableRepository):
+        for chunk in batched(items, self._batch_size):
+            await repo.insert_many(chunk)
+
+
+class CreateSchemaUseCase(BaseUseCase):
+    def __init__(self, customers_repo: BaseManageableRepository):
+        self._customers_repo = customers_repo
 
-        await self._customers_repo.db.create_relation(
-            "customer", "located_in", "city", {"key": "city", "condition": "=", "value": "name"})
-        await self._customers_repo.db.create_relation(
-            "customer", "works_in", "company",
-            {"key": "companyName", "condition": "=", "value": "name"})
+    async def execute(self):
+        await self._customers_repo.db.create_schema()
 
 
 class CreateUserUseCase(BaseUseCase):
@@ -103,11 +193,76 @@ class CreateUserUseCase(BaseUseCase):
 
 
 class GraphViewUseCase(BaseUseCase):
+    def __init__(self,
+                 customers_repo: BaseManageableRepository,
+                 country: str = None,
+                 limit: int = None,
+                 cursor: str = None):
+        self._customers_repo = customers_repo
+        self._country = country
+        self._limit = limit
+        self._cursor = cursor
+
+    async def execute(self):
+        data = await self._customers_repo.graph_view(self._country, self._limit, self._cursor)
+        return data
+
+
+class CustomerCountsUseCase(BaseUseCase):
+    def __init__(self, groups_repo: BaseManageableRepository, limit: int = None):
+        self._groups_repo = groups_repo
+        self._limit = limit
+
+    async def execute(self):
+        data = await self._groups_repo.get_counts("customer", self._limit)
+        return data
+
+
+class RebuildCountsUseCase(BaseUseCase):
     def __init__(self, customers_repo: BaseManageableRepository):
         self._customers_repo = customers_repo
 
     async def execute(self):
-        data = await self._customers_repo.graph_view()
+        await self._customers_repo.rebuild_counts()
+
+
+class NeighborsUseCase(BaseUseCase):
+    def __init__(self,
+                 repo: BaseManageableRepository,
+                 key,
+                 depth: int,
+                 fanout: int,
+                 limit: int,
+                 timeout: float = None):
+        self._repo = repo
+        self._key = key
+        self._depth = depth
+        self._fanout = fanout
+        self._limit = limit
+        self._timeout = timeout
+
+    async def execute(self):
+        data = await self._repo.neighbors(
+            self._key, self._depth, self._fanout, self._limit, self._timeout)
+        return data
+
+
+class ShortestPathUseCase(BaseUseCase):
+    def __init__(self,
+                 customers_repo: BaseManageableRepository,
+                 source: str,
+                 target: str,
+                 max_length: int,
+                 timeout: float = None):
+        self._customers_repo = customers_repo
+        self._source = source
+        self._target = target
+        self._max_length = max_length
+        self._timeout = timeout
+
+    async def execute(self):
+        data = await self._customers_repo.shortest_path(
+            self._source, self._target, self._max_length, self._timeout)
         return data
 
 
@@ -124,11 +279,18 @@ class GetCountryUseCase(BaseUseCase):
 
 
 class ListCountriesUseCase(BaseUseCase):
-    def __init__(self, countries_repo: BaseManageableRepository):
+    def __init__(self,
+                 countries_repo: BaseManageableRepository,
+                 limit: int = None,
+                 cursor: str = None,
+                 stream: bool = False):
         self._countries_repo = countries_repo
+        self._limit = limit
+        self._cursor = cursor
+        self._stream = stream
 
     async def execute(self):
-        data = await self._countries_repo.get_all()
+        data = await self._countries_repo.get_all(self._limit, self._cursor, self._stream)
         return data
 
 
@@ -145,11 +307,18 @@ class GetCityUseCase(BaseUseCase):
 
 
 class ListCitiesUseCase(BaseUseCase):
-    def __init__(self, cities_repo: BaseManageableRepository):
+    def __init__(self,
+                 cities_repo: BaseManageableRepository,
+                 limit: int = None,
+                 cursor: str = None,
+                 stream: bool = False):
         self._cities_repo = cities_repo
+        self._limit = limit
+        self._cursor = cursor
+        self._stream = stream
 
     async def execute(self):
-        data = await self._cities_repo.get_all()
+        data = await self._cities_repo.get_all(self._limit, self._cursor, self._stream)
         return data
 
 
@@ -166,9 +335,16 @@ class GetCompanyUseCase(BaseUseCase):
 
 
 class ListCompaniesUseCase(BaseUseCase):
-    def __init__(self, companies_repo: BaseManageableRepository):
+    def __init__(self,
+                 companies_repo: BaseManageableRepository,
+                 limit: int = None,
+                 cursor: str = None,
+                 stream: bool = False):
         self._companies_repo = companies_repo
+        self._limit = limit
+        self._cursor = cursor
+        self._stream = stream
 
     async def execute(self):
-        data = await self._companies_repo.get_all()
+        data = await self._companies_repo.get_all(self._limit, self._cursor, self._stream)
         return data
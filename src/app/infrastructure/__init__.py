@@ -1,3 +1,4 @@
+import tempfile
 from pathlib import Path
 
 BASE_DIR = Path(__file__).resolve().parent.parent.parent
@@ -7,3 +8,75 @@ NEO4J_PORT = "NEO4J_PORT"
 NEO4J_USER = "NEO4J_USER"
 NEO4J_PASSWORD = "NEO4J_PASSWORD"
 NEO4J_DB = "NEO4J_DB"
+NEO4J_MAX_CONNECTION_POOL_SIZE = "NEO4J_MAX_CONNECTION_POOL_SIZE"
+NEO4J_CONNECTION_ACQUISITION_TIMEOUT = "NEO4J_CONNECTION_ACQUISITION_TIMEOUT"
+NEO4J_MAX_CONNECTION_LIFETIME = "NEO4J_MAX_CONNECTION_LIFETIME"
+NEO4J_CLIENT_MODE = "NEO4J_CLIENT_MODE"
+NEO4J_EXECUTOR_MAX_WORKERS = "NEO4J_EXECUTOR_MAX_WORKERS"
+NEO4J_EXECUTOR_MAX_STREAMS = "NEO4J_EXECUTOR_MAX_STREAMS"
+NEO4J_SLOW_QUERY_THRESHOLD = "NEO4J_SLOW_QUERY_THRESHOLD"
+NEO4J_SLOW_QUERY_PLAN = "NEO4J_SLOW_QUERY_PLAN"
+NEO4J_SLOW_QUERY_SAMPLE_RATE = "NEO4J_SLOW_QUERY_SAMPLE_RATE"
+API_MAX_PAGE_SIZE = "API_MAX_PAGE_SIZE"
+API_STREAM_RESPONSES = "API_STREAM_RESPONSES"
+API_MAX_BATCH_SIZE = "API_MAX_BATCH_SIZE"
+API_COMPRESSION_MIN_SIZE = "API_COMPRESSION_MIN_SIZE"
+API_SEARCH_LIMIT = "API_SEARCH_LIMIT"
+API_MAX_SEARCH_LIMIT = "API_MAX_SEARCH_LIMIT"
+API_MAX_GRAPH_DEPTH = "API_MAX_GRAPH_DEPTH"
+API_MAX_GRAPH_FANOUT = "API_MAX_GRAPH_FANOUT"
+API_MAX_GRAPH_NODES = "API_MAX_GRAPH_NODES"
+API_MAX_PATH_LENGTH = "API_MAX_PATH_LENGTH"
+API_GRAPH_QUERY_TIMEOUT = "API_GRAPH_QUERY_TIMEOUT"
+API_COALESCE_REQUESTS = "API_COALESCE_REQUESTS"
+CACHE_BACKEND = "CACHE_BACKEND"
+REPLICA_BACKEND = "REPLICA_BACKEND"
+REPLICA_LABELS = "REPLICA_LABELS"
+CACHE_MAX_SIZE = "CACHE_MAX_SIZE"
+CACHE_TTL = "CACHE_TTL"
+CACHE_TTLS = "CACHE_TTLS"
+CACHE_SEARCH_TTL = "CACHE_SEARCH_TTL"
+DATA_VERSIONS = "DATA_VERSIONS"
+
+NEO4J_CLIENT_MODE_BLOCKING = "blocking"
+NEO4J_CLIENT_MODE_EXECUTOR = "executor"
+NEO4J_CLIENT_MODE_MEMORY = "memory"
+
+CACHE_BACKEND_NONE = "none"
+CACHE_BACKEND_MEMORY = "memory"
+
+REPLICA_BACKEND_NONE = "none"
+REPLICA_BACKEND_MEMORY = "memory"
+
+DATA_VERSIONS_MEMORY = "memory"
+
+DEFAULT_NEO4J_MAX_CONNECTION_POOL_SIZE = 100
+DEFAULT_NEO4J_CONNECTION_ACQUISITION_TIMEOUT = 60.0
+DEFAULT_NEO4J_MAX_CONNECTION_LIFETIME = 3600
+DEFAULT_NEO4J_CLIENT_MODE = NEO4J_CLIENT_MODE_EXECUTOR
+DEFAULT_NEO4J_EXECUTOR_MAX_WORKERS = 0
+DEFAULT_NEO4J_EXECUTOR_MAX_STREAMS = 0
+DEFAULT_NEO4J_SLOW_QUERY_THRESHOLD = 1.0
+DEFAULT_NEO4J_SLOW_QUERY_PLAN = "none"
+DEFAULT_NEO4J_SLOW_QUERY_SAMPLE_RATE = 0.1
+DEFAULT_API_PAGE_SIZE = 100
+DEFAULT_API_MAX_PAGE_SIZE = 1000
+DEFAULT_API_STREAM_RESPONSES = "1"
+DEFAULT_API_MAX_BATCH_SIZE = 1000
+DEFAULT_API_COMPRESSION_MIN_SIZE = 1024
+DEFAULT_API_SEARCH_LIMIT = 10
+DEFAULT_API_MAX_SEARCH_LIMIT = 100
+DEFAULT_API_MAX_GRAPH_DEPTH = 3
+DEFAULT_API_MAX_GRAPH_FANOUT = 50
+DEFAULT_API_MAX_GRAPH_NODES = 500
+DEFAULT_API_MAX_PATH_LENGTH = 6
+DEFAULT_API_GRAPH_QUERY_TIMEOUT = 5.0
+DEFAULT_API_COALESCE_REQUESTS = "1"
+DEFAULT_CACHE_BACKEND = CACHE_BACKEND_MEMORY
+DEFAULT_REPLICA_BACKEND = REPLICA_BACKEND_NONE
+DEFAULT_REPLICA_LABELS = "Country,City,Company"
+DEFAULT_CACHE_MAX_SIZE = 1024
+DEFAULT_CACHE_TTL = 0
+DEFAULT_CACHE_TTLS = "Country=300,City=300,Company=300"
+DEFAULT_CACHE_SEARCH_TTL = 5
+DEFAULT_DATA_VERSIONS = str(Path(tempfile.gettempdir()) / "neo4j_fastapi_versions.json")
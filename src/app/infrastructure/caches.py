@@ -0,0 +1,269 @@
+import importlib
+import json
+import time
+from abc import ABCMeta
+from abc import abstractmethod
+from collections import OrderedDict
+from typing import Any
+from typing import AsyncIterator
+from typing import Dict
+from typing import Hashable
+from typing import List
+from typing import Optional
+from typing import Set
+from typing import Tuple
+
+from src.app.infrastructure import queries
+from src.app.infrastructure.databases import AbstractBaseDBClient
+from src.app.infrastructure.exceptions import AppException
+from src.app.infrastructure.schema import linked_labels
+from src.app.infrastructure.singleflight import SingleFlight
+from src.app.infrastructure.singleflight import flight_key
+from src.app.infrastructure.versions import AbstractBaseVersionStore
+
+
+class AbstractBaseCache(metaclass=ABCMeta):
+    """
+    Storage for query results, grouped by node label so that a write to a
+    label can drop everything cached for it. ``get`` returns ``None`` on a
+    miss; cached values are always lists.
+    """
+
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+
+    @abstractmethod
+    async def get(self, label: str, key: Hashable) -> Optional[Any]:
+        raise NotImplementedError
+
+    @abstractmethod
+    async def set(self, label: str, key: Hashable, value: Any, ttl: float):
+        raise NotImplementedError
+
+    @abstractmethod
+    async def invalidate(self, label: str):
+        raise NotImplementedError
+
+
+class InMemoryCache(AbstractBaseCache):
+
+    def __init__(self, max_size: int = 1024):
+        super().__init__()
+        self._max_size = max_size
+        self._entries: OrderedDict = OrderedDict()
+        self._labels: Dict[str, Set[Tuple[str, Hashable]]] = {}
+
+    def __len__(self):
+        return len(self._entries)
+
+    async def get(self, label: str, key: Hashable) -> Optional[Any]:
+        entry_key = (label, key)
+        entry = self._entries.get(entry_key)
+        if entry is None:
+            self.misses += 1
+            return None
+        expires_at, value = entry
+        if expires_at < time.monotonic():
+            self._remove(entry_key)
+            self.misses += 1
+            return None
+        self._entries.move_to_end(entry_key)
+        self.hits += 1
+        return value
+
+    async def set(self, label: str, key: Hashable, value: Any, ttl: float):
+        entry_key = (label, key)
+        self._entries[entry_key] = (time.monotonic() + ttl, value)
+        self._entries.move_to_end(entry_key)
+        self._labels.setdefault(label, set()).add(entry_key)
+        while len(self._entries) > self._max_size:
+            self._remove(next(iter(self._entries)))
+
+    async def invalidate(self, label: str):
+        for entry_key in self._labels.pop(label, set()):
+            self._entries.pop(entry_key, None)
+
+    def _remove(self, entry_key: Tuple[str, Hashable]):
+        self._entries.pop(entry_key, None)
+        keys = self._labels.get(entry_key[0])
+        if keys is not None:
+            keys.discard(entry_key)
+
+
+def load_cache_backend(path: str) -> AbstractBaseCache:
+    """
+    Instantiates an external cache backend from a dotted ``module.Class``
+    path; the class reads its own configuration.
+    """
+    module_name, _, class_name = path.rpartition(".")
+    try:
+        backend = getattr(importlib.import_module(module_name), class_name)
+    except (ImportError, AttributeError, ValueError):
+        raise AppException(f"Unknown cache backend {path}")
+    if not issubclass(backend, AbstractBaseCache):
+        raise AppException(f"Cache backend {path} must extend AbstractBaseCache")
+    return backend()
+
+
+def parse_ttls(value: str) -> Dict[str, float]:
+    ttls = {}
+    for pair in filter(None, (item.strip() for item in value.split(","))):
+        label, _, ttl = pair.partition("=")
+        try:
+            ttls[label.strip().capitalize()] = float(ttl)
+        except ValueError:
+            raise AppException(f"Invalid cache TTL {pair}")
+    return ttls
+
+
+class CachedDBClient(AbstractBaseDBClient):
+    """
+    Read-through cache in front of another client. List and filter results
+    are cached per label with that label's TTL, and every write drops the
+    labels it touches. Streams of a label with a TTL replay its cached full
+    list, so unpaged listings of the reference labels are cached as well;
+    other streams, the graph view and traversals go straight to the wrapped
+    client. Search results get their own, usually short, TTL so that
+    repeated typeahead prefixes are answered from memory.
+
+    With a version store, the label's data version is part of every cache
+    key, so writes made by another process are not served from the cache
+    either. With ``flights``, concurrent misses of the same key share one
+    query, streams replayed from the cache included.
+    """
+
+    def __init__(self,
+                 db: AbstractBaseDBClient,
+                 cache: AbstractBaseCache,
+                 ttls: Dict[str, float] = None,
+                 default_ttl: float = 0,
+                 versions: AbstractBaseVersionStore = None,
+                 search_ttl: float = 0,
+                 flights: SingleFlight = None):
+        self._db = db
+        self._flights = flights
+        self._cache = cache
+        self._versions = versions
+        self._search_ttl = search_ttl
+        self._ttls = ttls or {}
+        self._default_ttl = default_ttl
+
+    @property
+    def db(self) -> AbstractBaseDBClient:
+        return self._db
+
+    @property
+    def cache(self) -> AbstractBaseCache:
+        return self._cache
+
+    @property
+    def connection(self):
+        return self._db.connection
+
+    def close(self):
+        self._db.close()
+
+    def _ttl(self, label: str) -> float:
+        return self._ttls.get(label, self._default_ttl)
+
+    async def _cached(self, label: str, key: Hashable, query, ttl: float = None):
+        ttl = self._ttl(label) if ttl is None else ttl
+        if ttl <= 0:
+            return await query()
+        if self._versions is not None:
+            key = (await self._versions.get(label), key)
+        data = await self._cache.get(label, key)
+        if data is None:
+            data = await self._fill(label, key, query, ttl)
+        return data
+
+    async def _fill(self, label: str, key: Hashable, query, ttl: float):
+        async def fill():
+            data = await query()
+            await self._cache.set(label, key, data, ttl)
+            return data
+
+        if self._flights is None:
+            return await fill()
+        return await self._flights.do(flight_key("cache", label, key), fill)
+
+    async def _invalidate_links(self, label: str):
+        for linked in linked_labels(label):
+            await self._cache.invalidate(linked)
+
+    async def select_all(self, node: str, limit: int = None, after: List = None) -> List:
+        label = node.capitalize()
+        key = ("all", limit, tuple(after) if after else None)
+        return await self._cached(label, key, lambda: self._db.select_all(node, limit, after))
+
+    def stream_all(self, node: str) -> AsyncIterator:
+        if self._ttl(node.capitalize()) <= 0:
+            return self._db.stream_all(node)
+        return self._replay_all(node)
+
+    async def _replay_all(self, node: str) -> AsyncIterator:
+        for record in await self.select_all(node):
+            yield record
+
+    async def filter(self, node: str, key: str, condition: str, value: str) -> List:
+        label = node.capitalize()
+        cache_key = ("filter", key, condition, value)
+        return await self._cached(
+            label, cache_key, lambda: self._db.filter(node, key, condition, value))
+
+    async def filter_by(self, node: str, expression: Dict) -> List:
+        label = node.capitalize()
+        cache_key = ("filter_by", json.dumps(expression, sort_keys=True, default=str))
+        return await self._cached(label, cache_key, lambda: self._db.filter_by(node, expression))
+
+    async def search(self, node: str, text: str, limit: int, mode: str = queries.SEARCH_PREFIX) -> List:
+        label = node.capitalize()
+        key = ("search", mode, " ".join(text.lower().split()), limit)
+        return await self._cached(
+            label, key, lambda: self._db.search(node, text, limit, mode), self._search_ttl)
+
+    async def get_many(self, node: str, ids: List) -> List:
+        return await self._db.get_many(node, ids)
+
+    async def select_property_map(self, node: str, key: str) -> Dict:
+        return await self._db.select_property_map(node, key)
+
+    async def neighbors(self, node: str, key, depth: int, fanout: int, limit: int,
+                        timeout: float = None) -> Tuple:
+        return await self._db.neighbors(node, key, depth, fanout, limit, timeout)
+
+    async def shortest_path(self, node: str, source, target, max_length: int, timeout: float = None):
+        return await self._db.shortest_path(node, source, target, max_length, timeout)
+
+    async def select_counts(self, node: str, counted: str, limit: int = None) -> List:
+        label = node.capitalize()
+        key = ("counts", counted.capitalize(), limit)
+        return await self._cached(label, key, lambda: self._db.select_counts(node, counted, limit))
+
+    async def insert(self, node: str, data: dict):
+        await self._db.insert(node, data)
+        await self._invalidate_links(node.capitalize())
+
+    async def insert_many(self, node: str, data: List[dict]):
+        await self._db.insert_many(node, data)
+        await self._invalidate_links(node.capitalize())
+
+    async def delete_many(self, node: str, ids: List):
+        await self._db.delete_many(node, ids)
+        await self._invalidate_links(node.capitalize())
+
+    async def create_schema(self):
+        await self._db.create_schema()
+
+    async def rebuild_counts(self, node: str):
+        await self._db.rebuild_counts(node)
+        await self._invalidate_links(node.capitalize())
+
+    async def graph_view(self, country: str = None, limit: int = None, after: List = None):
+        return await self._db.graph_view(country, limit, after)
+
+    async def create_relation(self, node_1: str, relation: str, node_2: str, where: Dict):
+        await self._db.create_relation(node_1, relation, node_2, where)
+        await self._cache.invalidate(node_1.capitalize())
+        await self._cache.invalidate(node_2.capitalize())
@@ -0,0 +1,155 @@
+import zlib
+from typing import List
+from typing import Optional
+
+from starlette.datastructures import Headers
+from starlette.datastructures import MutableHeaders
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover
+    brotli = None
+
+ENCODING_BROTLI = "br"
+ENCODING_GZIP = "gzip"
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 4
+
+
+def accepted_encoding(accept_encoding: str) -> Optional[str]:
+    """
+    Picks brotli when the client accepts it and the module is installed,
+    then gzip, from an ``Accept-Encoding`` header.
+    """
+    accepted = set()
+    for item in accept_encoding.split(","):
+        coding, _, params = item.strip().partition(";")
+        quality = params.strip()
+        if quality.startswith("q="):
+            try:
+                if float(quality[2:]) <= 0:
+                    continue
+            except ValueError:
+                continue
+        accepted.add(coding.strip().lower())
+    if brotli is not None and ENCODING_BROTLI in accepted:
+        return ENCODING_BROTLI
+    if ENCODING_GZIP in accepted or "*" in accepted:
+        return ENCODING_GZIP
+    return None
+
+
+class _Compressor:
+
+    def __init__(self, encoding: str):
+        if encoding == ENCODING_BROTLI:
+            self._brotli = brotli.Compressor(quality=BROTLI_QUALITY)
+        else:
+            self._brotli = None
+            self._zlib = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+
+    def compress(self, data: bytes) -> bytes:
+        # Flushed per chunk so that streamed bodies keep arriving as they are
+        # produced.
+        if self._brotli is not None:
+            return self._brotli.process(data) + self._brotli.flush()
+        return self._zlib.compress(data) + self._zlib.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self) -> bytes:
+        if self._brotli is not None:
+            return self._brotli.finish()
+        return self._zlib.flush(zlib.Z_FINISH)
+
+
+class CompressionMiddleware:
+    """
+    Compresses response bodies of at least ``minimum_size`` bytes with brotli
+    or gzip. Streamed bodies are held back until they reach that size and
+    then compressed chunk by chunk; a stream that ends before is sent as it
+    is. Responses that already carry a Content-Encoding
+    are left alone.
+    """
+
+    def __init__(self, app, minimum_size: int = 1024):
+        self.app = app
+        self.minimum_size = minimum_size
+
+    async def __call__(self, scope, receive, send):
+        encoding = None
+        if scope["type"] == "http" and self.minimum_size > 0:
+            encoding = accepted_encoding(Headers(scope=scope).get("accept-encoding", ""))
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+        responder = _CompressionResponder(self.app, encoding, self.minimum_size)
+        await responder(scope, receive, send)
+
+
+class _CompressionResponder:
+
+    def __init__(self, app, encoding: str, minimum_size: int):
+        self.app = app
+        self.encoding = encoding
+        self.minimum_size = minimum_size
+        self.send = None
+        self.start_message = None
+        self.compressor: Optional[_Compressor] = None
+        self.passthrough = False
+        self.pending: List[bytes] = []
+        self.pending_size = 0
+
+    async def __call__(self, scope, receive, send):
+        self.send = send
+        await self.app(scope, receive, self.send_compressed)
+
+    async def send_compressed(self, message):
+        if message["type"] == "http.response.start":
+            self.start_message = message
+            headers = Headers(raw=message["headers"])
+            self.passthrough = "content-encoding" in headers
+            return
+        if message["type"] != "http.response.body":
+            await self.send(message)
+            return
+        if self.passthrough:
+            await self._send_start()
+            await self.send(message)
+            return
+
+        body = message.get("body", b"")
+        more_body = message.get("more_body", False)
+        if self.compressor is None:
+            self.pending.append(body)
+            self.pending_size += len(body)
+            if self.pending_size < self.minimum_size:
+                if more_body:
+                    return
+                self.passthrough = True
+                await self._send_start()
+                await self.send({"type": "http.response.body", "body": b"".join(self.pending)})
+                return
+            body = b"".join(self.pending)
+            self.pending = []
+            self.compressor = _Compressor(self.encoding)
+            headers = MutableHeaders(raw=self.start_message["headers"])
+            headers["Content-Encoding"] = self.encoding
+            headers.add_vary_header("Accept-Encoding")
+            if more_body:
+                del headers["Content-Length"]
+                await self._send_start()
+            else:
+                body = self.compressor.compress(body) + self.compressor.finish()
+                headers["Content-Length"] = str(len(body))
+                await self._send_start()
+                await self.send({"type": "http.response.body", "body": body})
+                return
+
+        data = self.compressor.compress(body)
+        if not more_body:
+            data += self.compressor.finish()
+        await self.send({"type": "http.response.body", "body": data, "more_body": more_body})
+
+    async def _send_start(self):
+        if self.start_message is not None:
+            await self.send(self.start_message)
+            self.start_message = None
@@ -1,7 +1,12 @@
+import hashlib
+import time
 from abc import ABCMeta
 from typing import Any
 from typing import Dict
+from typing import Iterable
 from typing import List
+from typing import Optional
+from typing import Tuple
 
 from fastapi.requests import Request
 
@@ -10,18 +15,46 @@ import src.app.infrastructure as config
 from src.app.core import usecases
 from src.app.core.entities import EnvItemEntity
 from src.app.infrastructure.exceptions import AppException
+from src.app.infrastructure.exceptions import ValidationException
+from src.app.infrastructure import metrics
+from src.app.infrastructure.filters import check_not_paged
+from src.app.infrastructure.filters import coerce_value
+from src.app.infrastructure.filters import parse_query_filter
+from src.app.infrastructure.metrics import Sample
 from src.app.infrastructure.repositories import CustomersRepository
 from src.app.infrastructure.repositories import CitiesRepository
 from src.app.infrastructure.repositories import CountriesRepository
 from src.app.infrastructure.repositories import CompaniesRepository
 from src.app.infrastructure.repositories import EnvironRepository
+from src.app.infrastructure.repositories import NodeRepository
+from src.app.infrastructure.caches import AbstractBaseCache
+from src.app.infrastructure.caches import CachedDBClient
+from src.app.infrastructure.caches import InMemoryCache
+from src.app.infrastructure.caches import load_cache_backend
+from src.app.infrastructure.caches import parse_ttls
+from src.app.infrastructure.databases import AbstractBaseDBClient
 from src.app.infrastructure.databases import Neo4jDBClient
+from src.app.infrastructure.databases import Neo4jExecutorDBClient
+from src.app.infrastructure.memory import InMemoryGraphDBClient
+from src.app.infrastructure.memory import ReplicaDBClient
+from src.app.infrastructure.queries import SEARCH_PREFIX
+from src.app.infrastructure.responses import NDJSON_MEDIA_TYPE
+from src.app.infrastructure.schema import NODE_KEYS
+from src.app.infrastructure.singleflight import SingleFlight
+from src.app.infrastructure.slow_queries import SlowQueryLog
+from src.app.infrastructure.versions import AbstractBaseVersionStore
+from src.app.infrastructure.versions import FileVersionStore
+from src.app.infrastructure.versions import InMemoryVersionStore
+
+IF_NONE_MATCH_HEADER = "if-none-match"
 
 
 class BaseController(metaclass=ABCMeta):
     def __init__(self):
         self._env: EnvironRepository = None  # type: ignore
-        self._database: Neo4jDBClient = None  # type: ignore
+        self._database: AbstractBaseDBClient = None  # type: ignore
+        self._versions: AbstractBaseVersionStore = None  # type: ignore
+        self._flights: Optional[SingleFlight] = None
         self._customers: CustomersRepository = None  # type: ignore
         self._countries: CountriesRepository = None  # type: ignore
         self._cities: CitiesRepository = None  # type: ignore
@@ -33,49 +66,164 @@ class BaseController(metaclass=ABCMeta):
             self._env = EnvironRepository(config.BASE_DIR)
         return self._env
 
-    def _get_env(self, key: str) -> Any:
+    def _get_env(self, key: str, default: Any = None) -> Any:
         item: EnvItemEntity = self.env.get_one(key)  # type: ignore
         if item is None:
-            raise AppException(f"Missing environment variable {key}")
+            if default is None:
+                raise AppException(f"Missing environment variable {key}")
+            return default
         return item.value
 
     @property
-    def database(self) -> Neo4jDBClient:
+    def database(self) -> AbstractBaseDBClient:
         if not self._database:
-            self._database = Neo4jDBClient(
-                self._get_env(config.NEO4J_HOST),
-                self._get_env(config.NEO4J_PORT),
-                self._get_env(config.NEO4J_USER),
-                self._get_env(config.NEO4J_PASSWORD),
-            )
+            self._database = self._create_cache(self._create_replica(self._create_database()))
 
         return self._database
 
+    @property
+    def versions(self) -> AbstractBaseVersionStore:
+        if not self._versions:
+            self._versions = self._create_versions()
+
+        return self._versions
+
+    @property
+    def flights(self) -> Optional[SingleFlight]:
+        if not self._flights and self.coalesce:
+            self._flights = SingleFlight("query")
+
+        return self._flights
+
+    @property
+    def coalesce(self) -> bool:
+        value = self._get_env(config.API_COALESCE_REQUESTS, config.DEFAULT_API_COALESCE_REQUESTS)
+        return str(value).lower() in ("1", "true", "yes")
+
+    def _create_versions(self) -> AbstractBaseVersionStore:
+        path = self._get_env(config.DATA_VERSIONS, config.DEFAULT_DATA_VERSIONS)
+        if path == config.DATA_VERSIONS_MEMORY:
+            return InMemoryVersionStore()
+        return FileVersionStore(path)
+
+    def _create_database(self) -> AbstractBaseDBClient:
+        mode = self._get_env(config.NEO4J_CLIENT_MODE, config.DEFAULT_NEO4J_CLIENT_MODE)
+        if mode == config.NEO4J_CLIENT_MODE_MEMORY:
+            return InMemoryGraphDBClient()
+        args = (
+            self._get_env(config.NEO4J_HOST),
+            self._get_env(config.NEO4J_PORT),
+            self._get_env(config.NEO4J_USER),
+            self._get_env(config.NEO4J_PASSWORD),
+        )
+        kwargs = dict(
+            max_connection_pool_size=int(self._get_env(
+                config.NEO4J_MAX_CONNECTION_POOL_SIZE,
+                config.DEFAULT_NEO4J_MAX_CONNECTION_POOL_SIZE)),
+            connection_acquisition_timeout=float(self._get_env(
+                config.NEO4J_CONNECTION_ACQUISITION_TIMEOUT,
+                config.DEFAULT_NEO4J_CONNECTION_ACQUISITION_TIMEOUT)),
+            max_connection_lifetime=int(self._get_env(
+                config.NEO4J_MAX_CONNECTION_LIFETIME,
+                config.DEFAULT_NEO4J_MAX_CONNECTION_LIFETIME)),
+            slow_query_log=self._create_slow_query_log(),
+        )
+        if mode == config.NEO4J_CLIENT_MODE_EXECUTOR:
+            return Neo4jExecutorDBClient(
+                *args,
+                max_workers=int(self._get_env(
+                    config.NEO4J_EXECUTOR_MAX_WORKERS,
+                    config.DEFAULT_NEO4J_EXECUTOR_MAX_WORKERS)),
+                max_streams=int(self._get_env(
+                    config.NEO4J_EXECUTOR_MAX_STREAMS,
+                    config.DEFAULT_NEO4J_EXECUTOR_MAX_STREAMS)),
+                **kwargs,
+            )
+        if mode == config.NEO4J_CLIENT_MODE_BLOCKING:
+            return Neo4jDBClient(*args, **kwargs)
+        raise AppException(f"Unknown {config.NEO4J_CLIENT_MODE} {mode}")
+
+    def _create_replica(self, database: AbstractBaseDBClient) -> AbstractBaseDBClient:
+        backend = self._get_env(config.REPLICA_BACKEND, config.DEFAULT_REPLICA_BACKEND)
+        if backend == config.REPLICA_BACKEND_NONE:
+            return database
+        if backend != config.REPLICA_BACKEND_MEMORY:
+            raise AppException(f"Unknown {config.REPLICA_BACKEND} {backend}")
+        labels = self._get_env(config.REPLICA_LABELS, config.DEFAULT_REPLICA_LABELS)
+        return ReplicaDBClient(
+            database,
+            [label.strip() for label in labels.split(",") if label.strip()],
+            versions=self.versions,
+        )
+
+    def _create_slow_query_log(self) -> Optional[SlowQueryLog]:
+        threshold = float(self._get_env(
+            config.NEO4J_SLOW_QUERY_THRESHOLD, config.DEFAULT_NEO4J_SLOW_QUERY_THRESHOLD))
+        if threshold <= 0:
+            return None
+        return SlowQueryLog(
+            threshold,
+            plan=self._get_env(config.NEO4J_SLOW_QUERY_PLAN, config.DEFAULT_NEO4J_SLOW_QUERY_PLAN),
+            sample_rate=float(self._get_env(
+                config.NEO4J_SLOW_QUERY_SAMPLE_RATE, config.DEFAULT_NEO4J_SLOW_QUERY_SAMPLE_RATE)),
+        )
+
+    def _create_cache(self, database: AbstractBaseDBClient) -> AbstractBaseDBClient:
+        backend = self._get_env(config.CACHE_BACKEND, config.DEFAULT_CACHE_BACKEND)
+        if backend == config.CACHE_BACKEND_NONE:
+            return database
+        if backend == config.CACHE_BACKEND_MEMORY:
+            cache: AbstractBaseCache = InMemoryCache(
+                int(self._get_env(config.CACHE_MAX_SIZE, config.DEFAULT_CACHE_MAX_SIZE)))
+        else:
+            cache = load_cache_backend(backend)
+        return CachedDBClient(
+            database,
+            cache,
+            ttls=parse_ttls(self._get_env(config.CACHE_TTLS, config.DEFAULT_CACHE_TTLS)),
+            default_ttl=float(self._get_env(config.CACHE_TTL, config.DEFAULT_CACHE_TTL)),
+            versions=self.versions,
+            search_ttl=float(self._get_env(config.CACHE_SEARCH_TTL, config.DEFAULT_CACHE_SEARCH_TTL)),
+            flights=self.flights,
+        )
+
+    def close(self):
+        if self._database:
+            self._database.close()
+
+    @staticmethod
+    async def _execute(uc: usecases.BaseUseCase):
+        started = time.perf_counter()
+        try:
+            return await uc.execute()
+        finally:
+            metrics.USECASE_SECONDS.observe(time.perf_counter() - started, type(uc).__name__)
+
     @property
     def customers(self) -> CustomersRepository:
         if self._customers is None:
-            self._customers = CustomersRepository(self.database)
+            self._customers = CustomersRepository(self.database, self.versions, self.flights)
 
         return self._customers
 
     @property
     def countries(self) -> CountriesRepository:
         if self._countries is None:
-            self._countries = CountriesRepository(self.database)
+            self._countries = CountriesRepository(self.database, self.versions, self.flights)
 
         return self._countries
 
     @property
     def cities(self) -> CitiesRepository:
         if self._cities is None:
-            self._cities = CitiesRepository(self.database)
+            self._cities = CitiesRepository(self.database, self.versions, self.flights)
 
         return self._cities
 
     @property
     def companies(self) -> CompaniesRepository:
         if self._companies is None:
-            self._companies = CompaniesRepository(self.database)
+            self._companies = CompaniesRepository(self.database, self.versions, self.flights)
 
         return self._companies
 
@@ -90,72 +238,394 @@ class BaseHTTPController(BaseController):
     def request(self) -> Request:
         return self._request
 
+    @property
+    def database(self) -> AbstractBaseDBClient:
+        """
+        The client created once at startup and shared by every request; a
+        client per request would open a driver and its pool each time.
+        """
+        if not self._database:
+            self._database = getattr(self._request.app.state, "database", None)
+        if not self._database:
+            raise AppException("The database client is not set up, the app has not started")
+        return self._database
+
+    @property
+    def versions(self) -> AbstractBaseVersionStore:
+        if not self._versions:
+            self._versions = getattr(self._request.app.state, "versions", None)
+        if not self._versions:
+            self._versions = super().versions
+        return self._versions
+
+    @property
+    def flights(self) -> Optional[SingleFlight]:
+        if not self._flights:
+            self._flights = getattr(self._request.app.state, "flights", None)
+        if not self._flights:
+            self._flights = super().flights
+        return self._flights
+
     @property
     def request_headers(self) -> Dict:
         if self._request_headers is None:
             self._request_headers = dict(self._request.headers)
         return self._request_headers
 
+    @property
+    def page_params(self) -> Tuple[Optional[int], Optional[str]]:
+        params = self._request.query_params
+        cursor = params.get("cursor")
+        limit = params.get("limit")
+        if limit is None:
+            if cursor is None:
+                return None, None
+            limit = config.DEFAULT_API_PAGE_SIZE
+        try:
+            limit = int(limit)
+        except ValueError:
+            raise ValidationException(f"Invalid limit {limit}")
+        if limit < 1:
+            raise ValidationException(f"Invalid limit {limit}")
+        max_limit = int(self._get_env(config.API_MAX_PAGE_SIZE, config.DEFAULT_API_MAX_PAGE_SIZE))
+        return min(limit, max_limit), cursor
+
+    @property
+    def top(self) -> Optional[int]:
+        top = self._request.query_params.get("top")
+        if top is None:
+            return None
+        try:
+            top = int(top)
+        except ValueError:
+            raise ValidationException(f"Invalid top {top}")
+        if top < 1:
+            raise ValidationException(f"Invalid top {top}")
+        return min(top, int(self._get_env(config.API_MAX_PAGE_SIZE, config.DEFAULT_API_MAX_PAGE_SIZE)))
+
+    @property
+    def search_params(self) -> Tuple[str, int, str]:
+        params = self._request.query_params
+        text = params.get("q", "")
+        if not text.strip():
+            raise ValidationException("Search expects a query in q")
+        limit = params.get("limit", self._get_env(config.API_SEARCH_LIMIT, config.DEFAULT_API_SEARCH_LIMIT))
+        try:
+            limit = int(limit)
+        except ValueError:
+            raise ValidationException(f"Invalid limit {limit}")
+        if limit < 1:
+            raise ValidationException(f"Invalid limit {limit}")
+        max_limit = int(self._get_env(config.API_MAX_SEARCH_LIMIT, config.DEFAULT_API_MAX_SEARCH_LIMIT))
+        return text, min(limit, max_limit), params.get("match", SEARCH_PREFIX)
+
+    def _bounded_int(self, name: str, default: int, maximum: int) -> int:
+        value = self._request.query_params.get(name, default)
+        try:
+            value = int(value)
+        except ValueError:
+            raise ValidationException(f"Invalid {name} {value}")
+        if value < 1:
+            raise ValidationException(f"Invalid {name} {value}")
+        return min(value, maximum)
+
+    def _env_int(self, key: str, default: int) -> int:
+        return int(self._get_env(key, default))
+
+    def neighborhood_params(self, node_name: str) -> Tuple[Any, int, int, int]:
+        params = self._request.query_params
+        missing = [key for key in NODE_KEYS[node_name] if key not in params]
+        if missing:
+            raise ValidationException(f"Missing {', '.join(missing)} for {node_name}")
+        values = [params[key] for key in NODE_KEYS[node_name]]
+        max_fanout = self._env_int(config.API_MAX_GRAPH_FANOUT, config.DEFAULT_API_MAX_GRAPH_FANOUT)
+        max_nodes = self._env_int(config.API_MAX_GRAPH_NODES, config.DEFAULT_API_MAX_GRAPH_NODES)
+        return (
+            values[0] if len(values) == 1 else values,
+            self._bounded_int(
+                "depth", 1, self._env_int(config.API_MAX_GRAPH_DEPTH, config.DEFAULT_API_MAX_GRAPH_DEPTH)),
+            self._bounded_int("fanout", max_fanout, max_fanout),
+            self._bounded_int("limit", max_nodes, max_nodes),
+        )
+
+    @property
+    def path_params(self) -> Tuple[str, str, int]:
+        params = self._request.query_params
+        source, target = params.get("source"), params.get("target")
+        if not source or not target:
+            raise ValidationException("Paths expect a source and a target")
+        if source == target:
+            raise ValidationException("Source and target must differ")
+        max_length = self._env_int(config.API_MAX_PATH_LENGTH, config.DEFAULT_API_MAX_PATH_LENGTH)
+        return source, target, self._bounded_int("max_length", max_length, max_length)
+
+    @property
+    def graph_timeout(self) -> float:
+        return float(self._get_env(config.API_GRAPH_QUERY_TIMEOUT, config.DEFAULT_API_GRAPH_QUERY_TIMEOUT))
+
+    async def filter_expression(self, node_name: str) -> Dict:
+        check_not_paged(self._request.query_params.keys())
+        if self._request.method == "POST":
+            try:
+                return await self._request.json()
+            except ValueError:
+                raise ValidationException("Filter body must be JSON")
+        return parse_query_filter(node_name, self._request.query_params.multi_items())
+
+    async def batch_ids(self, node_name: str) -> List:
+        try:
+            body = await self._request.json()
+        except ValueError:
+            raise ValidationException("Batch body must be JSON")
+        ids = body.get("ids") if isinstance(body, dict) else None
+        if not isinstance(ids, list):
+            raise ValidationException("Batch body must be {\"ids\": [...]}")
+        max_size = int(self._get_env(config.API_MAX_BATCH_SIZE, config.DEFAULT_API_MAX_BATCH_SIZE))
+        if len(ids) > max_size:
+            raise ValidationException(f"Batches are limited to {max_size} ids")
+        size = len(NODE_KEYS[node_name])
+        for item_id in ids:
+            values = [item_id] if size == 1 else item_id
+            valid = isinstance(values, list) and len(values) == size and all(
+                isinstance(value, (str, int)) for value in values)
+            if not valid:
+                raise ValidationException(f"Invalid id {item_id} for {node_name}")
+        return ids
+
+    async def etag(self, *labels: str) -> str:
+        """
+        Returns a weak ETag for the response to this request, derived from the
+        data versions of the labels it reads.
+        """
+        versions = [await self.versions.get(label) for label in labels]
+        content = "|".join(versions + [
+            self._request.url.path,
+            str(self._request.query_params),
+            NDJSON_MEDIA_TYPE if self.wants_ndjson else "",
+        ])
+        return f'W/"{hashlib.sha1(content.encode("utf-8")).hexdigest()}"'
+
+    def not_modified(self, etag: str) -> bool:
+        header = self.request_headers.get(IF_NONE_MATCH_HEADER)
+        if header is None:
+            return False
+        if header.strip() == "*":
+            return True
+        tags = (tag.strip() for tag in header.split(","))
+        return etag[2:] in (tag[2:] if tag.startswith("W/") else tag for tag in tags)
+
+    @property
+    def wants_ndjson(self) -> bool:
+        return NDJSON_MEDIA_TYPE in self.request_headers.get("accept", "")
+
+    @property
+    def stream(self) -> bool:
+        value = self._get_env(config.API_STREAM_RESPONSES, config.DEFAULT_API_STREAM_RESPONSES)
+        return str(value).lower() in ("1", "true", "yes")
+
 
 class APIController(BaseHTTPController):
 
     async def list_customers(self):
-        uc = usecases.ListCustomersUseCase(self.customers)
-        data = await uc.execute()
+        uc = usecases.ListCustomersUseCase(self.customers, *self.page_params, self.stream)
+        data = await self._execute(uc)
         return data
 
     async def get_customer(self, key: str, condition: str, value: str):
-        uc = usecases.GetCustomerUseCase(key, condition, value, self.customers)
-        data = await uc.execute()
+        uc = usecases.GetCustomerUseCase(
+            key, condition, coerce_value(self.customers.NODE_NAME, key, value), self.customers)
+        data = await self._execute(uc)
+        return data
+
+    async def search_customers(self):
+        uc = usecases.SearchNodesUseCase(*self.search_params, self.customers)
+        data = await self._execute(uc)
+        return data
+
+    async def filter_customers(self):
+        return await self._filter_nodes(self.customers)
+
+    async def filter_companies(self):
+        return await self._filter_nodes(self.companies)
+
+    async def filter_countries(self):
+        return await self._filter_nodes(self.countries)
+
+    async def filter_cities(self):
+        return await self._filter_nodes(self.cities)
+
+    async def _filter_nodes(self, repo: NodeRepository):
+        uc = usecases.FilterNodesUseCase(await self.filter_expression(repo.NODE_NAME), repo)
+        data = await self._execute(uc)
+        return data
+
+    async def batch_customers(self):
+        return await self._get_many_nodes(self.customers)
+
+    async def batch_companies(self):
+        return await self._get_many_nodes(self.companies)
+
+    async def batch_countries(self):
+        return await self._get_many_nodes(self.countries)
+
+    async def batch_cities(self):
+        return await self._get_many_nodes(self.cities)
+
+    async def _get_many_nodes(self, repo: NodeRepository):
+        uc = usecases.GetManyNodesUseCase(await self.batch_ids(repo.NODE_NAME), repo)
+        data = await self._execute(uc)
         return data
 
     async def list_companies(self):
-        uc = usecases.ListCompaniesUseCase(self.companies)
-        data = await uc.execute()
+        uc = usecases.ListCompaniesUseCase(self.companies, *self.page_params, self.stream)
+        data = await self._execute(uc)
         return data
 
     async def get_companies(self, key: str, condition: str, value: str):
-        uc = usecases.GetCompanyUseCase(key, condition, value, self.companies)
-        data = await uc.execute()
+        uc = usecases.GetCompanyUseCase(
+            key, condition, coerce_value(self.companies.NODE_NAME, key, value), self.companies)
+        data = await self._execute(uc)
         return data
 
     async def list_countries(self):
-        uc = usecases.ListCountriesUseCase(self.countries)
-        data = await uc.execute()
+        uc = usecases.ListCountriesUseCase(self.countries, *self.page_params, self.stream)
+        data = await self._execute(uc)
         return data
 
     async def get_countries(self, key: str, condition: str, value: str):
-        uc = usecases.GetCountryUseCase(key, condition, value, self.countries)
-        data = await uc.execute()
+        uc = usecases.GetCountryUseCase(
+            key, condition, coerce_value(self.countries.NODE_NAME, key, value), self.countries)
+        data = await self._execute(uc)
         return data
 
     async def list_cities(self):
-        uc = usecases.ListCitiesUseCase(self.cities)
-        data = await uc.execute()
+        uc = usecases.ListCitiesUseCase(self.cities, *self.page_params, self.stream)
+        data = await self._execute(uc)
         return data
 
     async def get_cities(self, key: str, condition: str, value: str):
-        uc = usecases.GetCityUseCase(key, condition, value, self.cities)
-        data = await uc.execute()
+        uc = usecases.GetCityUseCase(
+            key, condition, coerce_value(self.cities.NODE_NAME, key, value), self.cities)
+        data = await self._execute(uc)
+        return data
+
+    async def customers_per_country(self):
+        return await self._customer_counts(self.countries)
+
+    async def customers_per_city(self):
+        return await self._customer_counts(self.cities)
+
+    async def customers_per_company(self):
+        return await self._customer_counts(self.companies)
+
+    async def _customer_counts(self, repo: NodeRepository):
+        uc = usecases.CustomerCountsUseCase(repo, self.top)
+        data = await self._execute(uc)
         return data
 
+    async def customer_neighbors(self):
+        return await self._neighbors(self.customers)
+
+    async def company_neighbors(self):
+        return await self._neighbors(self.companies)
+
+    async def country_neighbors(self):
+        return await self._neighbors(self.countries)
+
+    async def city_neighbors(self):
+        return await self._neighbors(self.cities)
+
+    async def _neighbors(self, repo: NodeRepository):
+        uc = usecases.NeighborsUseCase(
+            repo, *self.neighborhood_params(repo.NODE_NAME), timeout=self.graph_timeout)
+        data = await self._execute(uc)
+        return data
+
+    async def shortest_path(self):
+        uc = usecases.ShortestPathUseCase(self.customers, *self.path_params, timeout=self.graph_timeout)
+        data = await self._execute(uc)
+        return data
+
+    def metrics(self) -> str:
+        return metrics.REGISTRY.render(self._metric_gauges())
+
+    def _metric_gauges(self) -> List[Tuple[str, str, List[Sample]]]:
+        gauges = []
+        database = self.database
+        if isinstance(database, CachedDBClient):
+            cache = database.cache
+            lookups = cache.hits + cache.misses
+            gauges.append(("cache_lookups", "Result cache lookups by outcome.", [
+                ("cache_lookups", {"result": "hit"}, cache.hits),
+                ("cache_lookups", {"result": "miss"}, cache.misses),
+            ]))
+            gauges.append(("cache_hit_ratio", "Share of result cache lookups that hit.", [
+                ("cache_hit_ratio", {}, cache.hits / lookups if lookups else 0),
+            ]))
+            database = database.db
+        if isinstance(database, ReplicaDBClient):
+            database = database.primary
+        if isinstance(database, Neo4jDBClient):
+            pool = database.pool_stats()
+            gauges.append(("neo4j_pool_connections", "Neo4j driver connections by state.", [
+                ("neo4j_pool_connections", {"state": state}, pool[state])
+                for state in ("in_use", "open", "max")
+            ]))
+        if isinstance(database, Neo4jExecutorDBClient):
+            executor = database.executor_stats()
+            gauges.append(("neo4j_executor_workers", "Threads available for Neo4j calls.", [
+                ("neo4j_executor_workers", {}, executor["workers"]),
+            ]))
+            gauges.append(("neo4j_executor_queue", "Neo4j calls waiting for a thread.", [
+                ("neo4j_executor_queue", {}, executor["queued"]),
+            ]))
+        return gauges
+
     async def get_graph_view(self):
-        uc = usecases.GraphViewUseCase(self.customers)
-        data = await uc.execute()
+        uc = usecases.GraphViewUseCase(
+            self.customers, self.request.query_params.get("country"), *self.page_params)
+        data = await self._execute(uc)
         return data
 
 
+class LifecycleController(BaseController):
+
+    async def startup(self) -> AbstractBaseDBClient:
+        return self.database
+
+    async def shutdown(self):
+        self.close()
+
+    @property
+    def compression_minimum_size(self) -> int:
+        return int(self._get_env(
+            config.API_COMPRESSION_MIN_SIZE, config.DEFAULT_API_COMPRESSION_MIN_SIZE))
+
+
 class CLIController(BaseController):
 
+    async def create_schema(self):
+        uc = usecases.CreateSchemaUseCase(self.customers)
+        await self._execute(uc)
+
+    async def rebuild_counts(self):
+        uc = usecases.RebuildCountsUseCase(self.customers)
+        await self._execute(uc)
+
     async def create_user(self, data: Dict):
         uc = usecases.CreateUserUseCase(data, self.customers)
-        await uc.execute()
+        await self._execute(uc)
 
-    async def synchronize(self, data: List[Dict]):
+    async def synchronize(self,
+                          data: Iterable[Dict],
+                          batch_size: int = usecases.DEFAULT_BATCH_SIZE,
+                          delta: bool = False):
         uc = usecases.SynchronizeUseCase(
                 data,
                 self.customers,
                 self.countries,
                 self.cities,
-                self.companies)
-        await uc.execute()
+                self.companies,
+                batch_size=batch_size,
+                delta=delta)
+        await self._execute(uc)
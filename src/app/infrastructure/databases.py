@@ -1,11 +1,38 @@
+import asyncio
+import functools
+import time
 from abc import ABCMeta
 from abc import abstractmethod
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
+from typing import AsyncIterator
+from typing import Callable
 from typing import Dict
+from typing import Iterator
 from typing import List
+from typing import Tuple
 
 from neo4j import GraphDatabase
+from neo4j import unit_of_work
+from neo4j.exceptions import ClientError
 
-from src.app.infrastructure.filters import CONDITIONS_MAP
+from src.app.infrastructure import metrics
+from src.app.infrastructure import queries
+from src.app.infrastructure.exceptions import QueryTimeoutException
+from src.app.infrastructure.exceptions import ValidationException
+from src.app.infrastructure.filters import BaseFilter
+from src.app.infrastructure.schema import LOOKUP_INDEXES
+from src.app.infrastructure.schema import NODE_KEYS
+from src.app.infrastructure.schema import SEARCH_INDEXES
+from src.app.infrastructure.schema import count_property
+from src.app.infrastructure.schema import index_statement
+from src.app.infrastructure.schema import key_statements
+from src.app.infrastructure.schema import search_index_statement
+from src.app.infrastructure.slow_queries import RecordingTransaction
+from src.app.infrastructure.slow_queries import SlowQueryLog
+
+
+TRANSACTION_TIMED_OUT = "Neo.ClientError.Transaction.TransactionTimedOut"
 
 
 class AbstractBaseDBClient(metaclass=ABCMeta):
@@ -16,25 +43,88 @@ class AbstractBaseDBClient(metaclass=ABCMeta):
         raise NotImplementedError
 
     @abstractmethod
-    async def select_all(self, node: str, limit: int = None, after: int = None) -> List:
+    async def select_all(self, node: str, limit: int = None, after: List = None) -> List:
+        raise NotImplementedError
+
+    @abstractmethod
+    def stream_all(self, node: str) -> AsyncIterator:
         raise NotImplementedError
 
     @abstractmethod
     async def filter(self, node: str, key: str, condition: str, value: str) -> List:
         raise NotImplementedError
 
+    @abstractmethod
+    async def filter_by(self, node: str, expression: Dict) -> List:
+        raise NotImplementedError
+
+    @abstractmethod
+    async def search(self, node: str, text: str, limit: int, mode: str = queries.SEARCH_PREFIX) -> List:
+        raise NotImplementedError
+
+    @abstractmethod
+    async def get_many(self, node: str, ids: List) -> List:
+        raise NotImplementedError
+
+    @abstractmethod
+    async def select_property_map(self, node: str, key: str) -> Dict:
+        raise NotImplementedError
+
+    @abstractmethod
+    async def neighbors(self, node: str, key, depth: int, fanout: int, limit: int,
+                        timeout: float = None) -> Tuple:
+        raise NotImplementedError
+
+    @abstractmethod
+    async def shortest_path(self, node: str, source, target, max_length: int, timeout: float = None):
+        raise NotImplementedError
+
+    @abstractmethod
+    async def select_counts(self, node: str, counted: str, limit: int = None) -> List:
+        raise NotImplementedError
+
     @abstractmethod
     async def insert(self, node: str, data: dict):
         raise NotImplementedError
 
+    @abstractmethod
+    async def insert_many(self, node: str, data: List[dict]):
+        raise NotImplementedError
+
+    @abstractmethod
+    async def delete_many(self, node: str, ids: List):
+        raise NotImplementedError
+
+    @abstractmethod
+    async def create_schema(self):
+        raise NotImplementedError
+
+    @abstractmethod
+    async def rebuild_counts(self, node: str):
+        raise NotImplementedError
+
 
 class Neo4jDBClient(AbstractBaseDBClient):
 
-    def __init__(self, host: str, port: int, username: str, password: str):
+    def __init__(self,
+                 host: str,
+                 port: int,
+                 username: str,
+                 password: str,
+                 max_connection_pool_size: int = 100,
+                 connection_acquisition_timeout: float = 60.0,
+                 max_connection_lifetime: int = 3600,
+                 fetch_size: int = 1000,
+                 slow_query_log: SlowQueryLog = None):
         self._host = host
         self._port = port
         self._username = username
         self._password = password
+        self._max_connection_pool_size = max_connection_pool_size
+        self._connection_acquisition_timeout = connection_acquisition_timeout
+        self._max_connection_lifetime = max_connection_lifetime
+        self._fetch_size = fetch_size
+        self._slow_query_log = slow_query_log
         self._connection = None
 
     @property
@@ -42,33 +132,223 @@ class Neo4jDBClient(AbstractBaseDBClient):
         if not self._connection:
             uri = f"{self._host}:{self._port}"
             self._connection = GraphDatabase.driver(
-                uri=uri, auth=(self._username, self._password))
+                uri=uri,
+                auth=(self._username, self._password),
+                max_connection_pool_size=self._max_connection_pool_size,
+                connection_acquisition_timeout=self._connection_acquisition_timeout,
+                max_connection_lifetime=self._max_connection_lifetime,
+            )
         return self._connection
 
     def close(self):
-        self._connection.close()
+        if self._slow_query_log is not None:
+            self._slow_query_log.close()
+        if self._connection:
+            self._connection.close()
+            self._connection = None
 
-    async def select_all(self, node: str, limit: int = None, after: int = None):
+    def _run_read(self, work: Callable, *args):
         with self.connection.session() as session:
-            result = session.read_transaction(self._find_all, node)
-        self.close()
+            return self._measure(session.read_transaction, "read", work, *args)
+
+    def _run_write(self, work: Callable, *args):
+        with self.connection.session() as session:
+            return self._measure(session.write_transaction, "write", work, *args)
+
+    def _measure(self, run: Callable, access: str, work: Callable, *args):
+        operation = work.__name__.lstrip("_")
+        statements: List = []
+        if self._slow_query_log is not None:
+            work = self._recording(work, statements)
+        started = time.perf_counter()
+        try:
+            result = run(work, *args)
+        except Exception:
+            metrics.QUERY_ERRORS.inc(operation)
+            raise
+        finally:
+            duration = time.perf_counter() - started
+            metrics.QUERY_SECONDS.observe(duration, operation, access)
+        rows = len(result) if isinstance(result, (list, dict)) else None
+        if rows is not None:
+            metrics.QUERY_ROWS.inc(operation, amount=rows)
+        self._check_slow(operation, access, duration, rows, statements)
         return result
 
-    async def filter(self, node: str, key: str, condition: str, value: str) -> List:
+    @staticmethod
+    def _recording(work: Callable, statements: List) -> Callable:
+        # Keeps the attributes unit_of_work sets, such as the timeout.
+        @functools.wraps(work)
+        def recorded(tx, *args):
+            del statements[:]
+            return work(RecordingTransaction(tx, statements), *args)
+        return recorded
+
+    def _check_slow(self, operation: str, access: str, duration: float, rows, statements: List):
+        if self._slow_query_log is not None and self._slow_query_log.is_slow(duration):
+            self._slow_query_log.record(operation, access, duration, rows, statements, self._query_plan)
+
+    def _query_plan(self, prefix: str, query: str, params: Dict) -> Dict:
         with self.connection.session() as session:
-            result = session.read_transaction(self._filter, node, key, condition, value)
-        self.close()
+            summary = session.run(f"{prefix} {query}", params).consume()
+        return summary.profile or summary.plan or {}
+
+    def _iter_records(self, query: str, params: Dict) -> Iterator:
+        # Only the time spent in the driver is measured, not the time the
+        # consumer takes between records, so a slow client isn't taken for a
+        # slow query.
+        duration = 0.0
+        rows = 0
+        try:
+            with self.connection.session(fetch_size=self._fetch_size) as session:
+                started = time.perf_counter()
+                records = iter(session.run(query, params))
+                duration += time.perf_counter() - started
+                while True:
+                    started = time.perf_counter()
+                    record = next(records, None)
+                    duration += time.perf_counter() - started
+                    if record is None:
+                        break
+                    rows += 1
+                    yield record
+        finally:
+            metrics.QUERY_SECONDS.observe(duration, "stream", "read")
+            metrics.QUERY_ROWS.inc("stream", amount=rows)
+            self._check_slow("stream", "read", duration, rows, [(query, params)])
+
+    def pool_stats(self) -> Dict[str, int]:
+        """
+        Returns the connections the driver holds and how many are in use.
+        Reads driver internals, so missing attributes just give zeros.
+        """
+        pool = getattr(self._connection, "_pool", None)
+        connections = dict(getattr(pool, "connections", None) or {})
+        in_use = sum(pool.in_use_connection_count(address) for address in connections) if pool else 0
+        return {
+            "max": self._max_connection_pool_size,
+            "open": sum(len(items) for items in connections.values()),
+            "in_use": in_use,
+        }
+
+    async def _read(self, work: Callable, *args):
+        return self._run_read(work, *args)
+
+    async def _write(self, work: Callable, *args):
+        return self._run_write(work, *args)
+
+    async def _stream(self, query: str, params: Dict) -> AsyncIterator:
+        for record in self._iter_records(query, params):
+            yield record
+
+    async def _read_bounded(self, timeout: float, work: Callable, *args):
+        """
+        Runs a read whose transaction the server aborts after ``timeout``
+        seconds.
+        """
+        if timeout:
+            work = functools.wraps(work)(unit_of_work(timeout=timeout)(work))
+        try:
+            return await self._read(work, *args)
+        except ClientError as error:
+            if error.code == TRANSACTION_TIMED_OUT:
+                raise QueryTimeoutException(f"Query exceeded {timeout}s")
+            raise
+
+    def stream_all(self, node: str) -> AsyncIterator:
+        query, params = self._find_all_query(queries.label(node))
+        return self._stream(query, params)
+
+    async def select_all(self, node: str, limit: int = None, after: List = None):
+        result = await self._read(self._find_all, queries.label(node), limit, after)
+        return result
+
+    async def filter(self, node: str, key: str, condition: str, value: str) -> List:
+        node_name = queries.label(node)
+        result = await self._read(
+            self._filter, node_name, queries.prop(node_name, key), queries.operator(condition), value)
+        return result
+
+    async def filter_by(self, node: str, expression: Dict) -> List:
+        node_name = queries.label(node)
+        builder = BaseFilter(node_name)
+        where = builder.generate(expression)
+        result = await self._read(self._filter_by, node_name, where, builder.params)
+        return result
+
+    async def search(self, node: str, text: str, limit: int, mode: str = queries.SEARCH_PREFIX) -> List:
+        index = queries.search_index(queries.label(node))
+        result = await self._read(self._search, index, queries.search_terms(text, mode), limit)
+        return result
+
+    async def get_many(self, node: str, ids: List) -> List:
+        result = await self._read(self._get_many, queries.label(node), ids)
+        return result
+
+    async def select_property_map(self, node: str, key: str) -> Dict:
+        node_name = queries.label(node)
+        result = await self._read(self._property_map, node_name, queries.prop(node_name, key))
+        return result
+
+    async def neighbors(self, node: str, key, depth: int, fanout: int, limit: int,
+                        timeout: float = None) -> Tuple:
+        result = await self._read_bounded(
+            timeout, self._neighbors, queries.label(node), key, depth, fanout, limit)
+        return result
+
+    async def shortest_path(self, node: str, source, target, max_length: int, timeout: float = None):
+        result = await self._read_bounded(
+            timeout, self._shortest_path, queries.label(node), source, target, max_length)
+        return result
+
+    async def select_counts(self, node: str, counted: str, limit: int = None) -> List:
+        node_name = queries.label(node)
+        counter = queries.prop(node_name, count_property(queries.label(counted)))
+        result = await self._read(self._select_counts, node_name, counter, limit)
         return result
 
     async def insert(self, node: str, data: dict):
-        with self.connection.session() as session:
-            session.write_transaction(self._create, node, data)
-        self.close()
+        await self.insert_many(node, [data])
 
-    async def graph_view(self):
-        with self.connection.session() as session:
-            result = session.read_transaction(self._get_graph)
-        self.close()
+    async def insert_many(self, node: str, data: List[dict]):
+        node_name = queries.label(node)
+        groups: Dict[tuple, List[dict]] = {}
+        for row in data:
+            groups.setdefault(tuple(row.keys()), []).append(row)
+        merged: Dict[tuple, List[dict]] = {}
+        for keys, rows in groups.items():
+            statement = (
+                queries.merge_keys(node_name, keys),
+                queries.links(node_name, keys),
+                queries.aggregates(node_name, keys),
+            )
+            merged.setdefault(statement, []).extend(rows)
+        for (keys, links, aggregates), rows in merged.items():
+            await self._write(self._create_many, node_name, keys, links, aggregates, rows)
+
+    async def delete_many(self, node: str, ids: List):
+        await self._write(self._delete_many, queries.label(node), ids)
+
+    async def create_schema(self):
+        for node_name, keys in NODE_KEYS.items():
+            statement, fallback = key_statements(node_name, keys)
+            try:
+                await self._write(self._run_schema, statement)
+            except ClientError:
+                if fallback == statement:
+                    raise
+                await self._write(self._run_schema, fallback)
+        for node_name, keys in LOOKUP_INDEXES.items():
+            for key in keys:
+                await self._write(self._run_schema, index_statement(node_name, key))
+        for node_name, keys in SEARCH_INDEXES.items():
+            await self._write(self._run_schema, search_index_statement(node_name, keys))
+
+    async def rebuild_counts(self, node: str):
+        await self._write(self._rebuild_counts, queries.label(node))
+
+    async def graph_view(self, country: str = None, limit: int = None, after: List = None):
+        result = await self._read(self._get_graph, country, limit, after)
         return result
 
     async def update(self, uuid: str, data: dict):
@@ -78,66 +358,202 @@ class Neo4jDBClient(AbstractBaseDBClient):
         pass
 
     async def create_relation(self, node_1: str, relation: str, node_2: str, where: Dict):
-        with self.connection.session() as session:
-            session.write_transaction(self._create_relation, node_1, relation, node_2, where)
-        self.close()
+        node_1 = queries.label(node_1)
+        node_2 = queries.label(node_2)
+        if where["condition"] not in queries.OPERATORS:
+            raise ValidationException(f"Unknown condition {where['condition']}")
+        where = {
+            "key": queries.prop(node_1, where["key"]),
+            "condition": where["condition"],
+            "value": queries.prop(node_2, where["value"]),
+        }
+        await self._write(self._create_relation, node_1, queries.relation(relation), node_2, where)
 
     @staticmethod
     def _create_relation(tx, node_1: str, relation: str, node_2: str, where: Dict):
-        node_1_prefix = f"{node_1[0].lower()}1"
-        node_2_prefix = f"{node_2[0].lower()}2"
-        node_1 = node_1.capitalize()
-        node_2 = node_2.capitalize()
-
-        query = f"""
-        MATCH ({node_1_prefix}:{node_1}), ({node_2_prefix}:{node_2})
-        WHERE {node_1_prefix}.{where["key"]} {where["condition"]} {node_2_prefix}.{where["value"]}
-        MERGE ({node_1_prefix})-[r:{relation.upper()}]->({node_2_prefix})
+        query = queries.relation_query(
+            node_1, relation, node_2, where["key"], where["condition"], where["value"])
+        tx.run(query).consume()
+
+    @staticmethod
+    def _delete_many(tx, node_name: str, ids: List):
+        tx.run(queries.delete_many_query(node_name), ids=ids).consume()
+
+    @staticmethod
+    def _property_map(tx, node_name: str, key: str) -> Dict:
+        result = tx.run(queries.property_map_query(node_name, key))
+        return {
+            (tuple(record["id"]) if isinstance(record["id"], list) else record["id"]): record["value"]
+            for record in result
+        }
+
+    @staticmethod
+    def _run_schema(tx, statement: str):
+        tx.run(statement).consume()
+
+    @staticmethod
+    def _create_many(tx, node_name: str, keys: tuple, links: tuple, aggregates: tuple, rows: List[dict]):
+        tx.run(queries.create_many_query(node_name, keys, links, aggregates), rows=rows).consume()
+
+    @staticmethod
+    def _neighbors(tx, node_name: str, key, depth: int, fanout: int, limit: int) -> Tuple:
         """
-        result = tx.run(query)
-        return result
+        Breadth first expansion from the node with ``key``, one statement per
+        level. Returns the start node and the relationships reached, with no
+        more than ``limit`` nodes in total.
+        """
+        start = tx.run(queries.node_query(node_name), id=key).single()
+        if start is None:
+            return None, []
+        start = start["n"]
+        seen = {start.id}
+        frontier = [start.id]
+        relationships = {}
+        for _ in range(depth):
+            if not frontier or len(seen) >= limit:
+                break
+            result = tx.run(queries.expand_query(), frontier=frontier, fanout=fanout)
+            frontier = []
+            for record in result:
+                relationship, node = record["r"], record["b"]
+                if node.id not in seen:
+                    if len(seen) >= limit:
+                        continue
+                    seen.add(node.id)
+                    frontier.append(node.id)
+                relationships[relationship.id] = relationship
+            result.consume()
+        return start, list(relationships.values())
 
     @staticmethod
-    def _create(tx, node_name: str, data: dict):
-        prefix = node_name[0].lower()
-        node_name = node_name.capitalize()
+    def _shortest_path(tx, node_name: str, source, target, max_length: int):
+        record = tx.run(
+            queries.shortest_path_query(node_name, max_length), source=source, target=target).single()
+        return None if record is None else record["p"]
 
-        k_v_pairs = [f"{key}: ${key}" for key in data.keys()]
-        values = []
-        for pair in k_v_pairs:
-            values.append(f"{pair}")
-        query = f"""
-        MERGE ({prefix}:{node_name}
-        { {" ,".join(values)} } 
-        ) RETURN {prefix}""".replace("'", "")
-        result = tx.run(query, **data)
-        return result
+    @staticmethod
+    def _select_counts(tx, node_name: str, counter: str, limit: int = None):
+        result = tx.run(queries.top_groups_query(node_name, counter, limit is not None), limit=limit)
+        return [record for record in result]
+
+    @staticmethod
+    def _rebuild_counts(tx, node_name: str):
+        for statement in queries.rebuild_counts_queries(node_name):
+            tx.run(statement).consume()
 
     @staticmethod
-    def _find_all(tx, node_name: str):
-        prefix = node_name[0].lower()
-        node_name = node_name.capitalize()
-        query = (
-            f"MATCH ({prefix}:{node_name}) RETURN {prefix}"
-        )
-        result = tx.run(query)
+    def _find_all_query(node_name: str, limit: int = None, after: List = None) -> Tuple[str, Dict]:
+        query = queries.find_all_query(node_name, limit is not None, after is not None)
+        if limit is None:
+            return query, {}
+        params = {f"after{i}": value for i, value in enumerate(after or [])}
+        return query, dict(limit=limit, **params)
+
+    @classmethod
+    def _find_all(cls, tx, node_name: str, limit: int = None, after: List = None):
+        query, params = cls._find_all_query(node_name, limit, after)
+        result = tx.run(query, **params)
         return [record for record in result]
 
     @staticmethod
     def _filter(tx, node_name: str, key: str, condition: str, value: str):
-        condition_val = CONDITIONS_MAP.get(condition, "=")
-        prefix = node_name[0].lower()
-        node_name = node_name.capitalize()
-        query = (
-            f"MATCH ({prefix}:{node_name}) "
-            f"WHERE {prefix}.{key} {condition_val} ${key} "
-            f"RETURN {prefix}"
-        )
-        result = tx.run(query, **{key: value})
+        result = tx.run(queries.filter_query(node_name, key, condition), value=value)
+        return [record for record in result]
+
+    @staticmethod
+    def _filter_by(tx, node_name: str, where: str, params: Dict):
+        result = tx.run(queries.filter_expression_query(node_name, where), params)
+        return [record for record in result]
+
+    @staticmethod
+    def _search(tx, index: str, terms: str, limit: int):
+        result = tx.run(queries.SEARCH_QUERY, index=index, terms=terms, limit=limit)
+        return [record for record in result]
+
+    @staticmethod
+    def _get_many(tx, node_name: str, ids: List):
+        result = tx.run(queries.get_many_query(node_name), ids=ids)
         return [record for record in result]
 
     @staticmethod
-    def _get_graph(tx):
-        query = "MATCH (c1:Country)-[]-(c2:City)-[]-(c3:Customer)-[]-(c4:Company) RETURN c1, c2, c3, c4"
-        result = tx.run(query)
+    def _get_graph(tx, country: str = None, limit: int = None, after: List = None):
+        query = queries.graph_query(country is not None, limit is not None, after is not None)
+        result = tx.run(query, country=country, limit=limit, after=after[0] if after else None)
         return [record for record in result]
+
+
+class Neo4jExecutorDBClient(Neo4jDBClient):
+    """
+    Runs the blocking driver calls on a bounded thread pool so that a slow
+    query doesn't stall the event loop.
+
+    A stream keeps its session, and so a connection, between the executor
+    hops that fetch its records, however slowly its client reads them. The
+    driver's connections are therefore split: at most ``max_streams``
+    streams are open at once, a quarter of the pool by default, and the
+    workers get the rest. With a pool of two or more, together they never
+    need more connections than the pool has, so neither waits for the
+    driver's acquisition timeout.
+    """
+
+    def __init__(self, *args, max_workers: int = None, max_streams: int = None, **kwargs):
+        super().__init__(*args, **kwargs)
+        pool = self._max_connection_pool_size
+        self._max_streams = max(1, min(max_streams or pool // 4, pool - 1))
+        available = max(1, pool - self._max_streams)
+        self._max_workers = min(max_workers or available, available)
+        self._executor = None
+        self._streams: asyncio.Semaphore = None  # type: ignore
+
+    @property
+    def executor(self) -> ThreadPoolExecutor:
+        if not self._executor:
+            self._executor = ThreadPoolExecutor(
+                max_workers=self._max_workers, thread_name_prefix="neo4j")
+        return self._executor
+
+    def executor_stats(self) -> Dict[str, int]:
+        queue = getattr(self._executor, "_work_queue", None)
+        return {
+            "workers": self._max_workers,
+            "queued": queue.qsize() if queue is not None else 0,
+            "streams": self._max_streams,
+        }
+
+    def close(self):
+        if self._executor:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+        super().close()
+
+    async def _read(self, work: Callable, *args):
+        loop = asyncio.get_event_loop()
+        return await loop.run_in_executor(
+            self.executor, functools.partial(self._run_read, work, *args))
+
+    async def _write(self, work: Callable, *args):
+        loop = asyncio.get_event_loop()
+        return await loop.run_in_executor(
+            self.executor, functools.partial(self._run_write, work, *args))
+
+    def _next_records(self, records: Iterator) -> List:
+        return list(islice(records, self._fetch_size))
+
+    async def _stream(self, query: str, params: Dict) -> AsyncIterator:
+        # Records are pulled a fetch_size chunk per executor hop; the session
+        # stays open between hops and is closed on the executor as well.
+        if self._streams is None:
+            self._streams = asyncio.Semaphore(self._max_streams)
+        async with self._streams:
+            loop = asyncio.get_event_loop()
+            records = self._iter_records(query, params)
+            try:
+                while True:
+                    chunk = await loop.run_in_executor(
+                        self.executor, functools.partial(self._next_records, records))
+                    if not chunk:
+                        break
+                    for record in chunk:
+                        yield record
+            finally:
+                await loop.run_in_executor(self.executor, records.close)
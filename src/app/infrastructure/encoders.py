@@ -1,18 +1,72 @@
 import json
+from typing import Any
 
+from neo4j.data import Record
+from neo4j.graph import Entity
 from neo4j.graph import Node
+from neo4j.graph import Relationship
 
 from src.app.core.entities import BaseEntity
 
+try:
+    import orjson
+except ImportError:  # pragma: no cover
+    orjson = None
+
+_SCALARS = frozenset((str, int, float, bool, type(None)))
+_ENTITIES = frozenset((Node, Relationship))
+_SEQUENCES = frozenset((list, tuple, Record))
+
+
+def to_primitive(value: Any) -> Any:
+    """
+    Flattens records, nodes, relationships and entities into plain lists and
+    dicts, so the JSON encoder never has to fall back to ``default()``.
+    Records are tuples and stay arrays, nodes and relationships become their
+    property dicts and domain entities what their ``serialize()`` returns.
+    """
+    # Exact class lookups first: isinstance against the driver's Mapping
+    # based classes goes through ABCMeta and dominates on large results.
+    cls = value.__class__
+    if cls in _SCALARS:
+        return value
+    if cls in _ENTITIES:
+        return dict(value.items())
+    if cls in _SEQUENCES:
+        return [to_primitive(item) for item in value]
+    if cls is dict:
+        return {key: to_primitive(item) for key, item in value.items()}
+    if isinstance(value, BaseEntity):
+        return to_primitive(value.serialize())
+    if isinstance(value, Entity):
+        return dict(value.items())
+    if isinstance(value, (list, tuple)):
+        return [to_primitive(item) for item in value]
+    if isinstance(value, dict):
+        return {key: to_primitive(item) for key, item in value.items()}
+    return value
+
 
 class ResponseEncoder(json.JSONEncoder):
     def default(self, instance):
-        if issubclass(instance.__class__, Node):
-            data = {k: instance[k] for k in instance.keys()}
-            return data
-        if issubclass(instance.__class__, BaseEntity):
-            data = instance.serialize()
-            return {**data}
+        if isinstance(instance, (Entity, BaseEntity)):
+            return to_primitive(instance)
         else:
             return str(instance)
         return super().default(instance)
+
+
+_json_encoder = ResponseEncoder(
+    ensure_ascii=False,
+    allow_nan=False,
+    indent=None,
+    separators=(",", ":"),
+)
+
+
+def dumps(content: Any) -> bytes:
+    content = to_primitive(content)
+    if orjson is not None:
+        return orjson.dumps(content, default=_json_encoder.default)
+    return _json_encoder.encode(content).encode("utf-8")
+
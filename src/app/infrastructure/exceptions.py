@@ -1,2 +1,10 @@
 class AppException(Exception):
     pass
+
+
+class ValidationException(AppException):
+    pass
+
+
+class QueryTimeoutException(AppException):
+    pass
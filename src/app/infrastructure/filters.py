@@ -1,22 +1,171 @@
+from typing import Any
+from typing import Dict
+from typing import Iterable
+from typing import List
+from typing import Mapping
+from typing import Tuple
 from typing import TypedDict
+from typing import Union
+
+from src.app.infrastructure.exceptions import ValidationException
+from src.app.infrastructure.schema import NODE_PROPERTIES
+from src.app.infrastructure.schema import PROPERTY_TYPES
 
 CONDITIONS = ("eq", "ne", "gt", "gte", "lt", "lte")
 CONDITIONS_MAP = {
     "eq": "=",
-    "ne": "!=",
+    "ne": "<>",
     "gt": ">",
     "gte": ">=",
     "lt": "<",
     "lte": "<="
 }
 
+CONDITION_IN = "in"
+CONDITION_STARTSWITH = "startswith"
+CONDITION_BETWEEN = "between"
+CONDITION_NULL = "null"
+EXPRESSION_CONDITIONS = CONDITIONS + (
+    CONDITION_IN, CONDITION_STARTSWITH, CONDITION_BETWEEN, CONDITION_NULL,
+)
+
+OPERATOR_AND = "and"
+OPERATOR_OR = "or"
+
+QUERY_SEPARATOR = "__"
+QUERY_LIST_SEPARATOR = ","
+# Paging parameters, which filter results don't support.
+PAGING_QUERY_PARAMS = ("limit", "cursor")
+
+MAX_FILTER_CONDITIONS = 64
+MAX_FILTER_VALUES = 1000
+
 
 class Condition(TypedDict):
     key: str
     condition: str
-    value: str
+    value: Any
+
+
+Expression = Union[Condition, Dict[str, List[Any]]]
 
 
 class BaseFilter:
-    def generate(self, condition: Condition):
-        return f""
+    """
+    Compiles a filter expression into one parameterized ``WHERE`` clause.
+
+    An expression is either a condition ``{"key", "condition", "value"}`` or
+    ``{"and": [...]}`` / ``{"or": [...]}`` over nested expressions. Besides
+    the comparisons in ``CONDITIONS_MAP`` a condition can be ``in`` (list),
+    ``startswith``, ``between`` (``[low, high]``, inclusive) or ``null``
+    (``true`` for IS NULL, ``false`` for IS NOT NULL). Parameters are numbered
+    in traversal order, so expressions of the same shape give the same text.
+    """
+
+    def __init__(self, node_name: str, prefix: str = "n"):
+        self._node_name = node_name
+        self._prefix = prefix
+        self._params: Dict[str, Any] = {}
+        self._conditions = 0
+
+    @property
+    def params(self) -> Dict[str, Any]:
+        return self._params
+
+    def _param(self, value: Any) -> str:
+        name = f"p{len(self._params)}"
+        self._params[name] = value
+        return f"${name}"
+
+    def _property(self, key: Any) -> str:
+        if key not in NODE_PROPERTIES[self._node_name]:
+            raise ValidationException(f"Unknown property {key} for {self._node_name}")
+        return f"{self._prefix}.{key}"
+
+    def generate(self, condition: Expression) -> str:
+        if not isinstance(condition, Mapping):
+            raise ValidationException(f"Invalid filter {condition}")
+        for operator in (OPERATOR_AND, OPERATOR_OR):
+            if operator in condition:
+                return self._generate_group(operator, condition[operator])
+        return self._generate_condition(condition)  # type: ignore
+
+    def _generate_group(self, operator: str, expressions: Any) -> str:
+        if not isinstance(expressions, list) or not expressions:
+            raise ValidationException(f"'{operator}' expects a non-empty list")
+        clauses = [self.generate(expression) for expression in expressions]
+        if len(clauses) == 1:
+            return clauses[0]
+        return "(" + f" {operator.upper()} ".join(clauses) + ")"
+
+    def _generate_condition(self, condition: Condition) -> str:
+        self._conditions += 1
+        if self._conditions > MAX_FILTER_CONDITIONS:
+            raise ValidationException(f"Filters are limited to {MAX_FILTER_CONDITIONS} conditions")
+
+        name = self._property(condition.get("key"))
+        operator = condition.get("condition", "eq")
+        value = condition.get("value")
+
+        if operator in CONDITIONS_MAP:
+            return f"{name} {CONDITIONS_MAP[operator]} {self._param(value)}"
+        if operator == CONDITION_IN:
+            if not isinstance(value, list) or len(value) > MAX_FILTER_VALUES:
+                raise ValidationException(
+                    f"'{CONDITION_IN}' expects a list of at most {MAX_FILTER_VALUES} values")
+            return f"{name} IN {self._param(value)}"
+        if operator == CONDITION_STARTSWITH:
+            if not isinstance(value, str):
+                raise ValidationException(f"'{CONDITION_STARTSWITH}' expects a string")
+            return f"{name} STARTS WITH {self._param(value)}"
+        if operator == CONDITION_BETWEEN:
+            if not isinstance(value, list) or len(value) != 2:
+                raise ValidationException(f"'{CONDITION_BETWEEN}' expects [low, high]")
+            return f"({name} >= {self._param(value[0])} AND {name} <= {self._param(value[1])})"
+        if operator == CONDITION_NULL:
+            return f"{name} IS NULL" if value else f"{name} IS NOT NULL"
+        raise ValidationException(f"Unknown condition {operator}")
+
+
+def coerce_value(node_name: str, key: str, raw: str) -> Any:
+    """
+    Converts a value given as text to the declared type of the property, so
+    that ``customerCount__gt=3`` compares numbers; other properties keep it
+    as is.
+    """
+    kind = PROPERTY_TYPES.get(node_name, {}).get(key)
+    if kind is None:
+        return raw
+    try:
+        return kind(raw)
+    except ValueError:
+        raise ValidationException(f"Invalid {kind.__name__} {raw} for {node_name}.{key}")
+
+
+def check_not_paged(params: Iterable[str]):
+    for name in params:
+        if name in PAGING_QUERY_PARAMS:
+            raise ValidationException(f"Filter results are not paged, '{name}' is not supported")
+
+
+def parse_query_filter(node_name: str, params: Iterable[Tuple[str, str]]) -> Expression:
+    """
+    Builds an AND expression from query parameters such as
+    ``country=Germany&city__in=Berlin,München&region__null=true``, with values
+    converted to the types of their properties.
+    """
+    conditions: List[Condition] = []
+    for name, raw in params:
+        key, _, operator = name.partition(QUERY_SEPARATOR)
+        operator = operator or "eq"
+        value: Any
+        if operator in (CONDITION_IN, CONDITION_BETWEEN):
+            value = [coerce_value(node_name, key, item) for item in raw.split(QUERY_LIST_SEPARATOR)]
+        elif operator == CONDITION_NULL:
+            value = raw.lower() in ("1", "true", "yes")
+        else:
+            value = coerce_value(node_name, key, raw)
+        conditions.append({"key": key, "condition": operator, "value": value})
+    if not conditions:
+        raise ValidationException("At least one filter condition is required")
+    return {OPERATOR_AND: conditions}
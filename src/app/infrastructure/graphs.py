@@ -0,0 +1,83 @@
+from typing import Dict
+from typing import FrozenSet
+from typing import Iterable
+from typing import List
+from typing import Set
+from typing import Tuple
+
+from src.app.core.entities import CityEntity
+from src.app.core.entities import CompanyEntity
+from src.app.core.entities import CountryEntity
+from src.app.core.entities import CustomerEntity
+from src.app.core.usecases import SYNC_HASH
+
+LOCATED_IN = "LOCATED_IN"
+WORKS_IN = "WORKS_IN"
+
+# Properties a node exposes per label, the same ones its entity serializes;
+# the rest of what is stored on it, such as the sync hash, stays internal.
+NODE_FIELDS: Dict[str, FrozenSet[str]] = {
+    "Customer": frozenset(CustomerEntity.FIELDS),
+    "Country": frozenset(CountryEntity.FIELDS),
+    "City": frozenset(CityEntity.FIELDS),
+    "Company": frozenset(CompanyEntity.FIELDS),
+}
+
+
+class GraphBuilder:
+    """
+    Collects graph view rows into a nodes + edges payload where every node
+    appears once and edges refer to nodes by id.
+
+    Graph view rows hold a customer, its cities as ``[city, [countries]]``
+    pairs and its companies; traversals add nodes and relationships directly.
+    """
+
+    def __init__(self):
+        self._nodes: Dict[int, Dict] = {}
+        self._edges: List[Dict] = []
+        self._seen_edges: Set[Tuple[int, str, int]] = set()
+
+    def add_node(self, node) -> int:
+        if node.id not in self._nodes:
+            label = next(iter(node.labels), None)
+            fields = NODE_FIELDS.get(label)
+            self._nodes[node.id] = {
+                "id": node.id,
+                "label": label,
+                "properties": {
+                    key: value for key, value in node.items()
+                    if (key in fields if fields is not None else key != SYNC_HASH)
+                },
+            }
+        return node.id
+
+    def _add_edge(self, source: int, relation: str, target: int):
+        edge = (source, relation, target)
+        if edge not in self._seen_edges:
+            self._seen_edges.add(edge)
+            self._edges.append({"source": source, "type": relation, "target": target})
+
+    def add_relationship(self, relationship):
+        source = self.add_node(relationship.start_node)
+        target = self.add_node(relationship.end_node)
+        self._add_edge(source, relationship.type, target)
+
+    def add(self, row):
+        customer, cities, companies = row
+        customer_id = self.add_node(customer)
+        for city, countries in cities:
+            city_id = self.add_node(city)
+            self._add_edge(customer_id, LOCATED_IN, city_id)
+            for country in countries:
+                self._add_edge(city_id, LOCATED_IN, self.add_node(country))
+        for company in companies:
+            self._add_edge(customer_id, WORKS_IN, self.add_node(company))
+
+    def add_all(self, rows: Iterable) -> "GraphBuilder":
+        for row in rows:
+            self.add(row)
+        return self
+
+    def build(self) -> Dict:
+        return {"nodes": list(self._nodes.values()), "edges": self._edges}
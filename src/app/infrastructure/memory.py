@@ -0,0 +1,816 @@
+import asyncio
+import operator
+from bisect import bisect_left
+from bisect import bisect_right
+from collections import deque
+from typing import AsyncIterator
+from typing import Dict
+from typing import Iterable
+from typing import List
+from typing import Optional
+from typing import Set
+from typing import Tuple
+
+from neo4j.graph import Graph
+
+from src.app.infrastructure import queries
+from src.app.infrastructure.databases import AbstractBaseDBClient
+from src.app.infrastructure.exceptions import ValidationException
+from src.app.infrastructure.filters import CONDITION_BETWEEN
+from src.app.infrastructure.filters import CONDITION_IN
+from src.app.infrastructure.filters import CONDITION_NULL
+from src.app.infrastructure.filters import CONDITION_STARTSWITH
+from src.app.infrastructure.filters import CONDITIONS_MAP
+from src.app.infrastructure.filters import OPERATOR_AND
+from src.app.infrastructure.filters import OPERATOR_OR
+from src.app.infrastructure.filters import BaseFilter
+from src.app.infrastructure.schema import LOOKUP_INDEXES
+from src.app.infrastructure.schema import NODE_AGGREGATES
+from src.app.infrastructure.schema import NODE_KEYS
+from src.app.infrastructure.schema import NODE_LINKS
+from src.app.infrastructure.schema import RELATIONS
+from src.app.infrastructure.schema import SEARCH_INDEXES
+from src.app.infrastructure.schema import count_property
+from src.app.infrastructure.versions import AbstractBaseVersionStore
+
+COMPARISONS = {
+    "=": operator.eq,
+    "<>": operator.ne,
+    ">": operator.gt,
+    ">=": operator.ge,
+    "<": operator.lt,
+    "<=": operator.le,
+}
+RANGES = (">", ">=", "<", "<=")
+
+FUZZY_DISTANCE = 2
+
+Key = Tuple
+NodeRef = Tuple[str, Key]
+Edge = Tuple[int, str, int, int]
+
+
+def _compare(op: str, left, right) -> bool:
+    # Comparisons with null or across types are never true in Cypher.
+    if left is None or right is None:
+        return False
+    try:
+        return COMPARISONS[op](left, right)
+    except TypeError:
+        return False
+
+
+def _matches(expression: Dict, props: Dict) -> bool:
+    if OPERATOR_AND in expression:
+        return all(_matches(item, props) for item in expression[OPERATOR_AND])
+    if OPERATOR_OR in expression:
+        return any(_matches(item, props) for item in expression[OPERATOR_OR])
+    value = props.get(expression["key"])
+    condition = expression.get("condition", "eq")
+    target = expression.get("value")
+    if condition in CONDITIONS_MAP:
+        return _compare(CONDITIONS_MAP[condition], value, target)
+    if condition == CONDITION_IN:
+        return value is not None and value in target
+    if condition == CONDITION_STARTSWITH:
+        return isinstance(value, str) and value.startswith(target)
+    if condition == CONDITION_BETWEEN:
+        return _compare(">=", value, target[0]) and _compare("<=", value, target[1])
+    if condition == CONDITION_NULL:
+        return (value is None) == bool(target)
+    return False
+
+
+def _within_edits(word: str, term: str, distance: int = FUZZY_DISTANCE) -> bool:
+    if abs(len(word) - len(term)) > distance:
+        return False
+    previous = list(range(len(term) + 1))
+    for i, char in enumerate(word, 1):
+        current = [i]
+        for j, other in enumerate(term, 1):
+            current.append(min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (char != other)))
+        previous = current
+    return previous[-1] <= distance
+
+
+def _words(props: Dict, fields: Iterable[str]) -> List[str]:
+    return [
+        word for field in fields
+        for word in queries.WORD.findall(str(props.get(field) or "").lower())
+    ]
+
+
+class InMemoryGraphDBClient(AbstractBaseDBClient):
+    """
+    Keeps the graph in process and answers the same calls as the Neo4j
+    client, with the same record shapes, so it can stand in for it in tests
+    and serve as a read replica.
+
+    Nodes are held per label in dicts keyed by their node key. Equality
+    lookups on the key and on the LOOKUP_INDEXES properties go through hash
+    indexes kept up to date on every write; range conditions use a sorted
+    index per property that is built on the first range read after a write.
+    The SEARCH_INDEXES fields are kept in an inverted word index with a
+    sorted vocabulary for prefix terms. Edges are adjacency lists in both
+    directions. Writes follow the schema the way the Cypher statements do:
+    linked nodes are merged, stale edges replaced and counts moved.
+    """
+
+    def __init__(self):
+        self._nodes: Dict[str, Dict[Key, Dict]] = {label: {} for label in NODE_KEYS}
+        # {label: {property: {value: {node key}}}}
+        self._hash: Dict[str, Dict[str, Dict]] = {
+            label: {prop: {} for prop in LOOKUP_INDEXES.get(label, ())} for label in NODE_KEYS
+        }
+        # {label: {word: {node key}}}
+        self._words: Dict[str, Dict[str, Set[Key]]] = {label: {} for label in SEARCH_INDEXES}
+        # Built lazily and dropped when the label changes: the sorted node
+        # keys, the sorted (value, key) pairs per property and the sorted
+        # search vocabulary.
+        self._order: Dict[str, List[Key]] = {}
+        self._ranges: Dict[str, Dict[str, Tuple[List, List[Key]]]] = {}
+        self._vocabulary: Dict[str, List[str]] = {}
+        self._ids: Dict[NodeRef, int] = {}
+        self._refs: Dict[int, NodeRef] = {}
+        # {node id: {edge id: (relation, other node id)}}
+        self._out: Dict[int, Dict[int, Tuple[str, int]]] = {}
+        self._in: Dict[int, Dict[int, Tuple[str, int]]] = {}
+        self._next_id = 0
+
+    @property
+    def connection(self):
+        return None
+
+    def close(self):
+        pass
+
+    async def _round_trip(self):
+        """
+        Called before every operation. There is no round trip in process;
+        this only yields to the event loop, and is where a subclass can
+        simulate one.
+        """
+        await asyncio.sleep(0)
+
+    # Nodes and indexes
+
+    @staticmethod
+    def _key(node_name: str, props: Dict) -> Optional[Key]:
+        key = tuple(props.get(field) for field in NODE_KEYS[node_name])
+        return None if None in key else key
+
+    @staticmethod
+    def _id_key(node_name: str, value) -> Key:
+        return tuple(value) if len(NODE_KEYS[node_name]) > 1 else (value,)
+
+    def _new_id(self) -> int:
+        self._next_id += 1
+        return self._next_id
+
+    def _changed(self, node_name: str):
+        self._order.pop(node_name, None)
+        self._ranges.pop(node_name, None)
+
+    def _index(self, node_name: str, key: Key, props: Dict):
+        for prop, values in self._hash[node_name].items():
+            value = props.get(prop)
+            if value is not None:
+                values.setdefault(value, set()).add(key)
+        words = self._words.get(node_name)
+        if words is not None:
+            for word in _words(props, SEARCH_INDEXES[node_name]):
+                if word not in words:
+                    words[word] = set()
+                    self._vocabulary.pop(node_name, None)
+                words[word].add(key)
+        self._changed(node_name)
+
+    def _unindex(self, node_name: str, key: Key, props: Dict):
+        for prop, values in self._hash[node_name].items():
+            keys = values.get(props.get(prop))
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del values[props[prop]]
+        words = self._words.get(node_name)
+        if words is not None:
+            for word in _words(props, SEARCH_INDEXES[node_name]):
+                keys = words.get(word)
+                if keys is not None:
+                    keys.discard(key)
+                    if not keys:
+                        del words[word]
+                        self._vocabulary.pop(node_name, None)
+        self._changed(node_name)
+
+    def _merge(self, node_name: str, key: Key) -> Dict:
+        nodes = self._nodes[node_name]
+        props = nodes.get(key)
+        if props is None:
+            props = nodes[key] = dict(zip(NODE_KEYS[node_name], key))
+            node_id = self._new_id()
+            self._ids[(node_name, key)] = node_id
+            self._refs[node_id] = (node_name, key)
+            self._index(node_name, key, props)
+        return props
+
+    def _put(self, node_name: str, row: Dict) -> Optional[Tuple[Key, Optional[Dict]]]:
+        """
+        Merges ``row`` into its node and reindexes it; returns the key and
+        the properties before the write, ``None`` for a new node.
+        """
+        key = self._key(node_name, row)
+        if key is None:
+            return None
+        before = self._nodes[node_name].get(key)
+        before = dict(before) if before is not None else None
+        props = self._merge(node_name, key)
+        self._unindex(node_name, key, props)
+        props.update(row)
+        self._index(node_name, key, props)
+        return key, before
+
+    def _sorted(self, node_name: str, after: List = None) -> List[Key]:
+        order = self._order.get(node_name)
+        if order is None:
+            order = self._order[node_name] = sorted(self._nodes[node_name])
+        if after is not None:
+            return self._keys_after(order, after)
+        return order
+
+    @staticmethod
+    def _keys_after(keys: List[Key], after: List) -> List[Key]:
+        # Cursors are validated when decoded; a value that still can't be
+        # compared with the keys is a bad cursor, not a server error.
+        try:
+            return keys[bisect_right(keys, tuple(after)):]
+        except TypeError:
+            raise ValidationException(f"Invalid cursor {after}")
+
+    def _range_index(self, node_name: str, prop: str) -> Optional[Tuple[List, List[Key]]]:
+        ranges = self._ranges.setdefault(node_name, {})
+        if prop not in ranges:
+            pairs = [
+                (props[prop], key) for key, props in self._nodes[node_name].items()
+                if props.get(prop) is not None
+            ]
+            try:
+                pairs.sort()
+            except TypeError:
+                # Mixed types can't be ordered; such properties are scanned.
+                ranges[prop] = None  # type: ignore
+            else:
+                ranges[prop] = ([value for value, _ in pairs], [key for _, key in pairs])
+        return ranges[prop]
+
+    def _lookup(self, node_name: str, prop: str, op: str, value) -> Optional[Iterable[Key]]:
+        """
+        Returns the keys of the nodes whose ``prop`` compares true with
+        ``value`` from an index, or ``None`` when no index applies.
+        """
+        if value is None:
+            return ()
+        try:
+            if op == "=":
+                if NODE_KEYS[node_name] == (prop,):
+                    return [(value,)] if (value,) in self._nodes[node_name] else ()
+                values = self._hash[node_name].get(prop)
+                if values is not None:
+                    return values.get(value, ())
+            elif op not in RANGES:
+                return None
+            index = self._range_index(node_name, prop)
+            if index is None:
+                return None
+            values, keys = index
+            if op == "=":
+                return keys[bisect_left(values, value):bisect_right(values, value)]
+            if op == ">":
+                return keys[bisect_right(values, value):]
+            if op == ">=":
+                return keys[bisect_left(values, value):]
+            if op == "<":
+                return keys[:bisect_left(values, value)]
+            return keys[:bisect_right(values, value)]
+        except TypeError:
+            # Unhashable values, or values that don't order with the stored
+            # ones, are left to the scan.
+            return None
+
+    def _candidates(self, node_name: str, expression: Dict) -> Optional[Iterable[Key]]:
+        """
+        Narrows a filter expression to the keys an index gives for one of
+        its conditions; the caller still checks the whole expression.
+        """
+        conditions = expression.get(OPERATOR_AND, [expression]) if OPERATOR_OR not in expression else []
+        for condition in conditions:
+            if OPERATOR_AND in condition or OPERATOR_OR in condition:
+                continue
+            prop = condition.get("key")
+            name = condition.get("condition", "eq")
+            value = condition.get("value")
+            if name in CONDITIONS_MAP and CONDITIONS_MAP[name] != "<>":
+                keys = self._lookup(node_name, prop, CONDITIONS_MAP[name], value)
+            elif name == CONDITION_IN and prop in self._hash[node_name]:
+                values = self._hash[node_name][prop]
+                try:
+                    keys = {key for item in value for key in values.get(item, ())}
+                except TypeError:
+                    keys = None
+            else:
+                keys = None
+            if keys is not None:
+                return keys
+        return None
+
+    def _records(self, node_name: str, keys: Iterable[Key]) -> List:
+        nodes = self._nodes[node_name]
+        return [(dict(nodes[key]),) for key in keys if key in nodes]
+
+    # Reads
+
+    async def select_all(self, node: str, limit: int = None, after: List = None) -> List:
+        node_name = queries.label(node)
+        await self._round_trip()
+        keys = self._sorted(node_name, after)
+        if limit is not None:
+            keys = keys[:limit]
+        return self._records(node_name, keys)
+
+    async def _iter_all(self, node_name: str) -> AsyncIterator:
+        await self._round_trip()
+        nodes = self._nodes[node_name]
+        for key in self._sorted(node_name):
+            props = nodes.get(key)
+            if props is not None:
+                yield (dict(props),)
+
+    def stream_all(self, node: str) -> AsyncIterator:
+        return self._iter_all(queries.label(node))
+
+    async def filter(self, node: str, key: str, condition: str, value: str) -> List:
+        node_name = queries.label(node)
+        key = queries.prop(node_name, key)
+        op = queries.operator(condition)
+        await self._round_trip()
+        keys = self._lookup(node_name, key, op, value)
+        if keys is not None:
+            return self._records(node_name, keys)
+        return [
+            (dict(props),) for props in self._nodes[node_name].values()
+            if _compare(op, props.get(key), value)
+        ]
+
+    async def filter_by(self, node: str, expression: Dict) -> List:
+        node_name = queries.label(node)
+        BaseFilter(node_name).generate(expression)
+        await self._round_trip()
+        nodes = self._nodes[node_name]
+        keys = self._candidates(node_name, expression)
+        candidates = nodes.values() if keys is None else (nodes[key] for key in keys if key in nodes)
+        return [(dict(props),) for props in candidates if _matches(expression, props)]
+
+    def _term_words(self, node_name: str, term: str, mode: str) -> List[str]:
+        if mode == queries.SEARCH_PREFIX:
+            vocabulary = self._vocabulary.get(node_name)
+            if vocabulary is None:
+                vocabulary = self._vocabulary[node_name] = sorted(self._words[node_name])
+            start = bisect_left(vocabulary, term)
+            end = bisect_left(vocabulary, term + "\uffff")
+            return vocabulary[start:end]
+        return [word for word in self._words[node_name] if _within_edits(word, term)]
+
+    async def search(self, node: str, text: str, limit: int, mode: str = queries.SEARCH_PREFIX) -> List:
+        node_name = queries.label(node)
+        queries.search_index(node_name)
+        terms = [term[:-1] for term in queries.search_terms(text, mode).split(" AND ")]
+        await self._round_trip()
+        words = self._words[node_name]
+        scores: Optional[Dict[Key, int]] = None
+        for term in terms:
+            matched: Dict[Key, int] = {}
+            for word in self._term_words(node_name, term, mode):
+                for key in words[word]:
+                    if scores is None or key in scores:
+                        matched[key] = matched.get(key, 0) + 1
+            scores = matched if scores is None else {key: scores[key] + hits for key, hits in matched.items()}
+            if not scores:
+                return []
+        ranked = sorted(scores.items(), key=lambda item: (-item[1], item[0]))[:limit]  # type: ignore
+        nodes = self._nodes[node_name]
+        return [(dict(nodes[key]), float(score)) for key, score in ranked]
+
+    async def get_many(self, node: str, ids: List) -> List:
+        node_name = queries.label(node)
+        await self._round_trip()
+        nodes = self._nodes[node_name]
+        found = []
+        for item_id in ids:
+            props = nodes.get(self._id_key(node_name, item_id))
+            if props is not None:
+                found.append({"id": item_id, "n": dict(props)})
+        return found
+
+    async def select_property_map(self, node: str, key: str) -> Dict:
+        node_name = queries.label(node)
+        key = queries.prop(node_name, key)
+        await self._round_trip()
+        single = len(NODE_KEYS[node_name]) == 1
+        return {
+            (node_key[0] if single else node_key): props.get(key)
+            for node_key, props in self._nodes[node_name].items()
+        }
+
+    async def select_counts(self, node: str, counted: str, limit: int = None) -> List:
+        node_name = queries.label(node)
+        counter = count_property(queries.label(counted))
+        await self._round_trip()
+        groups = [
+            (key, props) for key, props in self._nodes[node_name].items()
+            if (props.get(counter) or 0) > 0
+        ]
+        groups.sort(key=lambda item: (-item[1][counter], item[0]))
+        if limit is not None:
+            groups = groups[:limit]
+        return [(dict(props),) for _, props in groups]
+
+    # Graph reads
+
+    def _graph_node(self, hydrator, node_id: int):
+        node_name, key = self._refs[node_id]
+        return hydrator.hydrate_node(node_id, {node_name}, dict(self._nodes[node_name][key]))
+
+    def _graph_edge(self, hydrator, edge: Edge):
+        edge_id, relation, source, target = edge
+        self._graph_node(hydrator, source)
+        self._graph_node(hydrator, target)
+        return hydrator.hydrate_relationship(edge_id, source, target, relation, {})
+
+    def _targets(self, node_id: int, relation: str, node_name: str) -> List[int]:
+        return [
+            target for edge_relation, target in self._out.get(node_id, {}).values()
+            if edge_relation == relation and self._refs[target][0] == node_name
+        ]
+
+    def _edges(self, node_id: int) -> List[Edge]:
+        """
+        Returns the edges of a node in both directions as
+        ``(edge id, relation, source id, target id)``.
+        """
+        edges = [
+            (edge_id, relation, node_id, target)
+            for edge_id, (relation, target) in self._out.get(node_id, {}).items()
+            if relation in RELATIONS
+        ]
+        edges.extend(
+            (edge_id, relation, source, node_id)
+            for edge_id, (relation, source) in self._in.get(node_id, {}).items()
+            if relation in RELATIONS
+        )
+        return edges
+
+    async def graph_view(self, country: str = None, limit: int = None, after: List = None):
+        await self._round_trip()
+        hydrator = Graph.Hydrator(Graph())
+        if country is None:
+            keys = self._sorted("Customer", after)
+        else:
+            keys = sorted(self._lookup("Customer", "country", "=", country) or ())
+            if after is not None:
+                keys = self._keys_after(keys, after)
+        rows = []
+        for key in keys:
+            customer_id = self._ids[("Customer", key)]
+            cities = [
+                [
+                    self._graph_node(hydrator, city_id),
+                    [self._graph_node(hydrator, country_id)
+                     for country_id in self._targets(city_id, "LOCATED_IN", "Country")],
+                ]
+                for city_id in self._targets(customer_id, "LOCATED_IN", "City")
+            ]
+            companies = [
+                self._graph_node(hydrator, company_id)
+                for company_id in self._targets(customer_id, "WORKS_IN", "Company")
+            ]
+            rows.append((self._graph_node(hydrator, customer_id), cities, companies))
+            if limit is not None and len(rows) >= limit:
+                break
+        return rows
+
+    async def neighbors(self, node: str, key, depth: int, fanout: int, limit: int,
+                        timeout: float = None) -> Tuple:
+        node_name = queries.label(node)
+        await self._round_trip()
+        start = self._ids.get((node_name, self._id_key(node_name, key)))
+        if start is None:
+            return None, []
+        hydrator = Graph.Hydrator(Graph())
+        seen = {start}
+        frontier = [start]
+        relationships = {}
+        for _ in range(depth):
+            if not frontier or len(seen) >= limit:
+                break
+            next_frontier = []
+            for node_id in frontier:
+                for edge in self._edges(node_id)[:fanout]:
+                    other = edge[3] if edge[2] == node_id else edge[2]
+                    if other not in seen:
+                        if len(seen) >= limit:
+                            continue
+                        seen.add(other)
+                        next_frontier.append(other)
+                    relationships[edge[0]] = self._graph_edge(hydrator, edge)
+            frontier = next_frontier
+        return self._graph_node(hydrator, start), list(relationships.values())
+
+    async def shortest_path(self, node: str, source, target, max_length: int, timeout: float = None):
+        node_name = queries.label(node)
+        await self._round_trip()
+        start = self._ids.get((node_name, self._id_key(node_name, source)))
+        end = self._ids.get((node_name, self._id_key(node_name, target)))
+        if start is None or end is None or start == end:
+            return None
+        parents: Dict[int, Optional[Tuple[int, Edge]]] = {start: None}
+        queue = deque([(start, 0)])
+        while queue and end not in parents:
+            node_id, length = queue.popleft()
+            if length >= max_length:
+                continue
+            for edge in self._edges(node_id):
+                other = edge[3] if edge[2] == node_id else edge[2]
+                if other not in parents:
+                    parents[other] = (node_id, edge)
+                    queue.append((other, length + 1))
+        if end not in parents:
+            return None
+        edges = []
+        node_id = end
+        while parents[node_id] is not None:
+            node_id, edge = parents[node_id]  # type: ignore
+            edges.append(edge)
+        hydrator = Graph.Hydrator(Graph())
+        nodes = [self._graph_node(hydrator, start)]
+        relationships = []
+        sequence = []
+        for edge_id, relation, edge_source, edge_target in reversed(edges):
+            relationships.append(hydrator.hydrate_unbound_relationship(edge_id, relation, {}))
+            forward = edge_source == nodes[-1].id
+            nodes.append(self._graph_node(hydrator, edge_target if forward else edge_source))
+            sequence.extend((len(relationships) if forward else -len(relationships), len(nodes) - 1))
+        return hydrator.hydrate_path(nodes, relationships, sequence)
+
+    # Writes
+
+    def _add_edge(self, source: int, relation: str, target: int):
+        for edge_relation, edge_target in self._out.get(source, {}).values():
+            if edge_relation == relation and edge_target == target:
+                return
+        edge_id = self._new_id()
+        self._out.setdefault(source, {})[edge_id] = (relation, target)
+        self._in.setdefault(target, {})[edge_id] = (relation, source)
+
+    def _remove_edge(self, edge_id: int, source: int, target: int):
+        self._out.get(source, {}).pop(edge_id, None)
+        self._in.get(target, {}).pop(edge_id, None)
+
+    def _move_counts(self, node_name: str, before: Optional[Dict], after: Optional[Dict]):
+        counter = count_property(node_name)
+        for group, group_keys in NODE_AGGREGATES.get(node_name, ()):
+            old = tuple(before.get(field) for _, field in group_keys) if before else None
+            new = tuple(after.get(field) for _, field in group_keys) if after else None
+            if old == new:
+                continue
+            for values, delta in ((new, 1), (old, -1)):
+                if values is None or None in values:
+                    continue
+                group_key = self._key(group, {key: value for (key, _), value in zip(group_keys, values)})
+                props = self._merge(group, group_key)  # type: ignore
+                props[counter] = (props.get(counter) or 0) + delta
+                self._ranges.pop(group, None)
+
+    def _link(self, node_name: str, key: Key, props: Dict):
+        node_id = self._ids[(node_name, key)]
+        for relation, target_name, link_keys in NODE_LINKS.get(node_name, ()):
+            values = {target_key: props.get(field) for target_key, field in link_keys}
+            if any(value is None for value in values.values()):
+                continue
+            target_key = self._key(target_name, values)
+            self._merge(target_name, target_key)  # type: ignore
+            target_id = self._ids[(target_name, target_key)]  # type: ignore
+            for edge_id, (edge_relation, other) in list(self._out.get(node_id, {}).items()):
+                if edge_relation == relation and other != target_id and self._refs[other][0] == target_name:
+                    self._remove_edge(edge_id, node_id, other)
+            self._add_edge(node_id, relation, target_id)
+
+    async def insert(self, node: str, data: dict):
+        await self.insert_many(node, [data])
+
+    async def insert_many(self, node: str, data: List[dict]):
+        node_name = queries.label(node)
+        for key in {key for row in data for key in row}:
+            queries.prop(node_name, key)
+        await self._round_trip()
+        for row in data:
+            written = self._put(node_name, row)
+            if written is None:
+                continue
+            key, before = written
+            props = self._nodes[node_name][key]
+            self._move_counts(node_name, before, props)
+            self._link(node_name, key, props)
+
+    async def delete_many(self, node: str, ids: List):
+        node_name = queries.label(node)
+        await self._round_trip()
+        for item_id in ids:
+            key = self._id_key(node_name, item_id)
+            props = self._nodes[node_name].pop(key, None)
+            if props is None:
+                continue
+            self._unindex(node_name, key, props)
+            self._move_counts(node_name, props, None)
+            node_id = self._ids.pop((node_name, key))
+            del self._refs[node_id]
+            for edge_id, (_, target) in self._out.pop(node_id, {}).items():
+                self._in.get(target, {}).pop(edge_id, None)
+            for edge_id, (_, source) in self._in.pop(node_id, {}).items():
+                self._out.get(source, {}).pop(edge_id, None)
+
+    async def create_relation(self, node_1: str, relation: str, node_2: str, where: Dict):
+        node_1 = queries.label(node_1)
+        node_2 = queries.label(node_2)
+        relation = queries.relation(relation)
+        op = where["condition"]
+        if op not in queries.OPERATORS:
+            raise ValidationException(f"Unknown condition {op}")
+        key = queries.prop(node_1, where["key"])
+        value = queries.prop(node_2, where["value"])
+        await self._round_trip()
+        for source_key, props in self._nodes[node_1].items():
+            targets = self._lookup(node_2, value, self._reverse(op), props.get(key))
+            if targets is None:
+                targets = [
+                    target_key for target_key, target in self._nodes[node_2].items()
+                    if _compare(op, props.get(key), target.get(value))
+                ]
+            source = self._ids[(node_1, source_key)]
+            for target_key in list(targets):
+                self._add_edge(source, relation, self._ids[(node_2, target_key)])
+
+    @staticmethod
+    def _reverse(op: str) -> str:
+        # a.x < b.y is b.y > a.x: the lookup runs on the target property.
+        return {">": "<", ">=": "<=", "<": ">", "<=": ">="}.get(op, op)
+
+    async def create_schema(self):
+        await self._round_trip()
+
+    async def rebuild_counts(self, node: str):
+        node_name = queries.label(node)
+        await self._round_trip()
+        counter = count_property(node_name)
+        for group, _ in NODE_AGGREGATES.get(node_name, ()):
+            for props in self._nodes[group].values():
+                props[counter] = 0
+            self._ranges.pop(group, None)
+        for props in self._nodes[node_name].values():
+            self._move_counts(node_name, None, props)
+
+    async def load(self, source: AbstractBaseDBClient, labels: Iterable[str]):
+        """
+        Copies every node of ``labels`` from ``source`` as it is, counts
+        included, and derives the edges between them from the schema links.
+        """
+        labels = [queries.label(label) for label in labels]
+        for node_name in labels:
+            async for record in source.stream_all(node_name):
+                self._put(node_name, dict(record[0]))
+        for node_name in labels:
+            for key, props in list(self._nodes[node_name].items()):
+                self._link(node_name, key, props)
+
+
+class ReplicaDBClient(AbstractBaseDBClient):
+    """
+    Serves the reads of ``labels`` from an in-memory copy of them and
+    everything else from the primary client.
+
+    The copy is loaded from the primary on the first read and reloaded as a
+    whole when the data version of one of the labels changes, or after a
+    write through this client, so a synchronization run from the command
+    line is picked up on the next read. Graph reads always go to the
+    primary, since they reach customers.
+    """
+
+    def __init__(self,
+                 primary: AbstractBaseDBClient,
+                 labels: Iterable[str],
+                 versions: AbstractBaseVersionStore = None):
+        self._primary = primary
+        self._labels = tuple(queries.label(label) for label in labels)
+        self._versions = versions
+        self._replica: Optional[InMemoryGraphDBClient] = None
+        self._loaded: Optional[Tuple] = None
+        self._writes = 0
+        self._lock = asyncio.Lock()
+
+    @property
+    def primary(self) -> AbstractBaseDBClient:
+        return self._primary
+
+    @property
+    def connection(self):
+        return self._primary.connection
+
+    def close(self):
+        self._primary.close()
+
+    async def _snapshot(self) -> Tuple:
+        versions = ()
+        if self._versions is not None:
+            versions = tuple([await self._versions.get(label) for label in self._labels])
+        return (self._writes,) + versions
+
+    async def refresh(self) -> InMemoryGraphDBClient:
+        snapshot = await self._snapshot()
+        if self._replica is None or self._loaded != snapshot:
+            async with self._lock:
+                if self._replica is None or self._loaded != snapshot:
+                    replica = InMemoryGraphDBClient()
+                    await replica.load(self._primary, self._labels)
+                    self._replica, self._loaded = replica, snapshot
+        return self._replica  # type: ignore
+
+    async def _source(self, node: str) -> AbstractBaseDBClient:
+        if node.capitalize() in self._labels:
+            return await self.refresh()
+        return self._primary
+
+    def _written(self):
+        self._writes += 1
+
+    async def select_all(self, node: str, limit: int = None, after: List = None) -> List:
+        return await (await self._source(node)).select_all(node, limit, after)
+
+    def stream_all(self, node: str) -> AsyncIterator:
+        if node.capitalize() in self._labels:
+            return self._stream_replica(node)
+        return self._primary.stream_all(node)
+
+    async def _stream_replica(self, node: str) -> AsyncIterator:
+        replica = await self.refresh()
+        async for record in replica.stream_all(node):
+            yield record
+
+    async def filter(self, node: str, key: str, condition: str, value: str) -> List:
+        return await (await self._source(node)).filter(node, key, condition, value)
+
+    async def filter_by(self, node: str, expression: Dict) -> List:
+        return await (await self._source(node)).filter_by(node, expression)
+
+    async def search(self, node: str, text: str, limit: int, mode: str = queries.SEARCH_PREFIX) -> List:
+        return await (await self._source(node)).search(node, text, limit, mode)
+
+    async def get_many(self, node: str, ids: List) -> List:
+        return await (await self._source(node)).get_many(node, ids)
+
+    async def select_property_map(self, node: str, key: str) -> Dict:
+        return await (await self._source(node)).select_property_map(node, key)
+
+    async def select_counts(self, node: str, counted: str, limit: int = None) -> List:
+        return await (await self._source(node)).select_counts(node, counted, limit)
+
+    async def neighbors(self, node: str, key, depth: int, fanout: int, limit: int,
+                        timeout: float = None) -> Tuple:
+        return await self._primary.neighbors(node, key, depth, fanout, limit, timeout)
+
+    async def shortest_path(self, node: str, source, target, max_length: int, timeout: float = None):
+        return await self._primary.shortest_path(node, source, target, max_length, timeout)
+
+    async def graph_view(self, country: str = None, limit: int = None, after: List = None):
+        return await self._primary.graph_view(country, limit, after)  # type: ignore
+
+    async def insert(self, node: str, data: dict):
+        await self._primary.insert(node, data)
+        self._written()
+
+    async def insert_many(self, node: str, data: List[dict]):
+        await self._primary.insert_many(node, data)
+        self._written()
+
+    async def delete_many(self, node: str, ids: List):
+        await self._primary.delete_many(node, ids)
+        self._written()
+
+    async def create_schema(self):
+        await self._primary.create_schema()
+
+    async def rebuild_counts(self, node: str):
+        await self._primary.rebuild_counts(node)
+        self._written()
+
+    async def create_relation(self, node_1: str, relation: str, node_2: str, where: Dict):
+        await self._primary.create_relation(node_1, relation, node_2, where)  # type: ignore
+        self._written()
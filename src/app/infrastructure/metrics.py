@@ -0,0 +1,195 @@
+"""
+In-process metrics in the Prometheus text exposition format.
+
+Counters and histograms are plain dicts keyed by label values, guarded by a
+lock because database timings are recorded from the executor threads.
+Gauges that describe current state (pool, executor, cache) are sampled when
+the metrics are rendered rather than kept up to date on the hot path.
+"""
+
+import threading
+import time
+from bisect import bisect_left
+from typing import Dict
+from typing import Iterable
+from typing import List
+from typing import Tuple
+
+CONTENT_TYPE = "text/plain; version=0.0.4"
+
+LATENCY_BUCKETS = (
+    0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0,
+)
+
+Sample = Tuple[str, Dict[str, str], float]
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names: Tuple[str, ...], values: Tuple, extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(str(value))}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _number(value: float) -> str:
+    return repr(float(value)) if value != int(value) else str(int(value))
+
+
+class Counter:
+
+    TYPE = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: Tuple[str, ...] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self._values: Dict[Tuple, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *labels, amount: float = 1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def samples(self) -> Iterable[str]:
+        with self._lock:
+            values = list(self._values.items())
+        for labels, value in values:
+            yield f"{self.name}{_labels(self.labelnames, labels)} {_number(value)}"
+
+
+class Histogram:
+
+    TYPE = "histogram"
+
+    def __init__(self,
+                 name: str,
+                 documentation: str,
+                 labelnames: Tuple[str, ...] = (),
+                 buckets: Tuple[float, ...] = LATENCY_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self.buckets = buckets
+        # Per label values: a count per bucket plus the +Inf bucket, and the sum.
+        self._values: Dict[Tuple, List] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, *labels):
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            entry = self._values.get(labels)
+            if entry is None:
+                entry = self._values[labels] = [[0] * (len(self.buckets) + 1), 0.0]
+            entry[0][index] += 1
+            entry[1] += value
+
+    def samples(self) -> Iterable[str]:
+        with self._lock:
+            values = [(labels, list(counts), total) for labels, (counts, total) in self._values.items()]
+        bounds = [_number(bound) for bound in self.buckets] + ["+Inf"]
+        for labels, counts, total in values:
+            cumulative = 0
+            for bound, count in zip(bounds, counts):
+                cumulative += count
+                le = _labels(self.labelnames, labels, f'le="{bound}"')
+                yield f"{self.name}_bucket{le} {cumulative}"
+            names = _labels(self.labelnames, labels)
+            yield f"{self.name}_sum{names} {_number(total)}"
+            yield f"{self.name}_count{names} {cumulative}"
+
+
+class Registry:
+
+    def __init__(self):
+        self._metrics: List = []
+
+    def counter(self, name: str, documentation: str, labelnames: Tuple[str, ...] = ()) -> Counter:
+        metric = Counter(name, documentation, labelnames)
+        self._metrics.append(metric)
+        return metric
+
+    def histogram(self, name: str, documentation: str, labelnames: Tuple[str, ...] = ()) -> Histogram:
+        metric = Histogram(name, documentation, labelnames)
+        self._metrics.append(metric)
+        return metric
+
+    def render(self, gauges: Iterable[Tuple[str, str, List[Sample]]] = ()) -> str:
+        """
+        Renders every registered metric, followed by ``gauges`` given as
+        ``(name, documentation, [(name, labels, value), ...])`` families.
+        """
+        lines = []
+        for metric in self._metrics:
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.TYPE}")
+            lines.extend(metric.samples())
+        for name, documentation, samples in gauges:
+            lines.append(f"# HELP {name} {documentation}")
+            lines.append(f"# TYPE {name} gauge")
+            for sample_name, labels, value in samples:
+                names = tuple(labels)
+                lines.append(
+                    f"{sample_name}{_labels(names, tuple(labels[key] for key in names))} {_number(value)}")
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+REQUEST_SECONDS = REGISTRY.histogram(
+    "http_request_duration_seconds", "HTTP request latency by route.", ("method", "route", "status"))
+USECASE_SECONDS = REGISTRY.histogram(
+    "usecase_duration_seconds", "Use case execution time.", ("usecase",))
+QUERY_SECONDS = REGISTRY.histogram(
+    "neo4j_query_duration_seconds", "Neo4j transaction time by operation.", ("operation", "access"))
+QUERY_ROWS = REGISTRY.counter(
+    "neo4j_query_rows_total", "Rows returned by Neo4j operations.", ("operation",))
+QUERY_ERRORS = REGISTRY.counter(
+    "neo4j_query_errors_total", "Neo4j operations that raised.", ("operation",))
+COALESCED_CALLS = REGISTRY.counter(
+    "coalesced_calls_total", "Calls served by an identical call already in flight.", ("scope",))
+
+
+class MetricsMiddleware:
+    """
+    Records the latency of every HTTP request under the path template of the
+    route that handled it, so path parameters don't multiply the series.
+    Streamed bodies are included, since the request ends with the last chunk.
+    """
+
+    def __init__(self, app):
+        self.app = app
+        self._paths: Dict = {}
+
+    def _route(self, scope) -> str:
+        endpoint = scope.get("endpoint")
+        if endpoint is None:
+            return "unmatched"
+        path = self._paths.get(endpoint)
+        if path is None:
+            for route in getattr(scope.get("app"), "routes", ()):
+                self._paths[getattr(route, "endpoint", None)] = getattr(route, "path", "")
+            path = self._paths.get(endpoint, getattr(endpoint, "__name__", "unknown"))
+        return path
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status = ["500"]
+
+        async def send_status(message):
+            if message["type"] == "http.response.start":
+                status[0] = str(message["status"])
+            await send(message)
+
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_status)
+        finally:
+            REQUEST_SECONDS.observe(
+                time.perf_counter() - started, scope["method"], self._route(scope), status[0])
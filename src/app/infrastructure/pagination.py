@@ -0,0 +1,48 @@
+import base64
+import binascii
+import json
+from typing import List
+from typing import Optional
+
+from src.app.infrastructure.exceptions import ValidationException
+from src.app.infrastructure.schema import NODE_KEYS
+from src.app.infrastructure.schema import PROPERTY_TYPES
+
+
+def encode_cursor(values: List) -> str:
+    raw = json.dumps(values, separators=(",", ":")).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii")
+
+
+def _key_value_valid(node_name: str, key: str, value) -> bool:
+    kind = PROPERTY_TYPES.get(node_name, {}).get(key, str)
+    return isinstance(value, kind) and not isinstance(value, bool)
+
+
+def decode_cursor(node_name: str, cursor: Optional[str]) -> Optional[List]:
+    """
+    Returns the node key values a cursor holds, checked against the types of
+    the key properties, so that a forged cursor is rejected instead of
+    comparing values of another type.
+    """
+    if not cursor:
+        return None
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+    except (binascii.Error, UnicodeError, ValueError):
+        raise ValidationException(f"Invalid cursor {cursor}")
+    keys = NODE_KEYS[node_name]
+    if not isinstance(values, list) or len(values) != len(keys):
+        raise ValidationException(f"Invalid cursor {cursor}")
+    if not all(_key_value_valid(node_name, key, value) for key, value in zip(keys, values)):
+        raise ValidationException(f"Invalid cursor {cursor}")
+    return values
+
+
+def record_cursor(node_name: str, record) -> str:
+    node = record[0]
+    return encode_cursor([node[key] for key in NODE_KEYS[node_name]])
+
+
+def entity_cursor(entity) -> str:
+    return encode_cursor([getattr(entity, key) for key in entity.KEYS])
@@ -0,0 +1,364 @@
+"""
+Cypher statement builders.
+
+Labels, property names and relation types are checked against the schema
+whitelist before they are put into a statement; every value is passed as a
+parameter. Statements are memoized per (operation, label, key set), so the
+same request always produces the same text and hits the server plan cache.
+"""
+
+import re
+from functools import lru_cache
+from typing import Tuple
+
+from src.app.infrastructure.exceptions import ValidationException
+from src.app.infrastructure.filters import CONDITIONS_MAP
+from src.app.infrastructure.schema import Aggregate
+from src.app.infrastructure.schema import Link
+from src.app.infrastructure.schema import NODE_AGGREGATES
+from src.app.infrastructure.schema import NODE_KEYS
+from src.app.infrastructure.schema import NODE_LINKS
+from src.app.infrastructure.schema import NODE_PROPERTIES
+from src.app.infrastructure.schema import RELATIONS
+from src.app.infrastructure.schema import SEARCH_INDEXES
+from src.app.infrastructure.schema import count_property
+from src.app.infrastructure.schema import search_index_name
+
+OPERATORS = frozenset(CONDITIONS_MAP.values())
+
+SEARCH_PREFIX = "prefix"
+SEARCH_FUZZY = "fuzzy"
+SEARCH_MODES = (SEARCH_PREFIX, SEARCH_FUZZY)
+MAX_SEARCH_TERMS = 8
+
+WORD = re.compile(r"\w+")
+
+# Hits come back ordered by score already.
+SEARCH_QUERY = (
+    "CALL db.index.fulltext.queryNodes($index, $terms) YIELD node, score "
+    "RETURN node AS n, score "
+    "LIMIT $limit"
+)
+
+
+def label(node: str) -> str:
+    name = node.capitalize()
+    if name not in NODE_PROPERTIES:
+        raise ValidationException(f"Unknown node {node}")
+    return name
+
+
+def prop(node_name: str, key: str) -> str:
+    if key not in NODE_PROPERTIES[node_name]:
+        raise ValidationException(f"Unknown property {key} for {node_name}")
+    return key
+
+
+def relation(name: str) -> str:
+    relation_type = name.upper()
+    if relation_type not in RELATIONS:
+        raise ValidationException(f"Unknown relation {name}")
+    return relation_type
+
+
+def operator(condition: str) -> str:
+    if condition not in CONDITIONS_MAP:
+        raise ValidationException(f"Unknown condition {condition}")
+    return CONDITIONS_MAP[condition]
+
+
+def search_index(node_name: str) -> str:
+    if node_name not in SEARCH_INDEXES:
+        raise ValidationException(f"{node_name} is not searchable")
+    return search_index_name(node_name)
+
+
+def search_terms(text: str, mode: str = SEARCH_PREFIX) -> str:
+    """
+    Turns user input into a Lucene query where every word has to match, as
+    a prefix (``berl*``) or within the default edit distance (``berlin~``).
+    Only word characters are kept, the same split the index analyzer does,
+    so the input can't carry query syntax.
+    """
+    if mode not in SEARCH_MODES:
+        raise ValidationException(f"Unknown search mode {mode}")
+    words = WORD.findall(text.lower())
+    if not words or len(words) > MAX_SEARCH_TERMS:
+        raise ValidationException(f"Search expects 1 to {MAX_SEARCH_TERMS} words")
+    suffix = "*" if mode == SEARCH_PREFIX else "~"
+    return " AND ".join(word + suffix for word in words)
+
+
+def merge_keys(node_name: str, keys: Tuple[str, ...]) -> Tuple[str, ...]:
+    """
+    Checks every property of the row against the whitelist, since all of them
+    are written, and returns the node key when the row has it, otherwise all
+    of them.
+    """
+    keys = tuple(prop(node_name, key) for key in keys)
+    node_keys = NODE_KEYS.get(node_name)
+    if node_keys and all(key in keys for key in node_keys):
+        return node_keys
+    return keys
+
+
+def links(node_name: str, keys: Tuple[str, ...]) -> Tuple[Link, ...]:
+    """
+    Returns the edges of ``NODE_LINKS`` that a row with these properties
+    carries all the target keys for.
+    """
+    return tuple(
+        link for link in NODE_LINKS.get(node_name, ())
+        if all(field in keys for _, field in link[2])
+    )
+
+
+def aggregates(node_name: str, keys: Tuple[str, ...]) -> Tuple[Aggregate, ...]:
+    """
+    Returns the groups of ``NODE_AGGREGATES`` that a row with these
+    properties carries all the group keys for.
+    """
+    return tuple(
+        aggregate for aggregate in NODE_AGGREGATES.get(node_name, ())
+        if all(field in keys for _, field in aggregate[1])
+    )
+
+
+def _known(source: str, fields) -> str:
+    return " AND ".join(f"{source}.{field} IS NOT NULL" for field in fields)
+
+
+def _count_update(variable: str, aggregate: Aggregate, source: str, counter: str, when: str, delta: str) -> str:
+    group, group_keys = aggregate
+    values = ", ".join(f"{key}: {source}.{field}" for key, field in group_keys)
+    return (
+        f"FOREACH (_ IN CASE WHEN {when} THEN [1] ELSE [] END | "
+        f"MERGE ({variable}:{group} {{{values}}}) "
+        f"SET {variable}.{counter} = coalesce({variable}.{counter}, 0) {delta}) "
+    )
+
+
+@lru_cache(maxsize=None)
+def create_many_query(node_name: str,
+                      keys: Tuple[str, ...],
+                      links: Tuple[Link, ...] = (),
+                      aggregates: Tuple[Aggregate, ...] = ()) -> str:
+    values = ", ".join(f"{key}: row.{key}" for key in keys)
+    statement = f"UNWIND $rows AS row MERGE (n:{node_name} {{{values}}}) "
+    if aggregates:
+        statement += "WITH n, row, n {.*} AS before "
+    statement += "SET n += row"
+    # A group count moves when the row lands in another group than the node
+    # was in before; a new node has no properties in ``before``.
+    counter = count_property(node_name)
+    for i, aggregate in enumerate(aggregates):
+        fields = [field for _, field in aggregate[1]]
+        moved = " OR ".join(f"coalesce(before.{field} <> row.{field}, true)" for field in fields)
+        added = f"{_known('row', fields)} AND ({moved})"
+        removed = f"{_known('before', fields)} AND ({moved})"
+        statement += " " + (
+            _count_update(f"g{i}", aggregate, "row", counter, added, "+ 1")
+            + _count_update(f"h{i}", aggregate, "before", counter, removed, "- 1")
+        ).rstrip()
+    # Each edge is merged against its target by key and any edge of the same
+    # type to another target is dropped, so a changed row moves its edges.
+    for i, (relation_type, target, target_keys) in enumerate(links):
+        values = ", ".join(f"{key}: row.{field}" for key, field in target_keys)
+        statement += (
+            f" WITH DISTINCT n, row "
+            f"MERGE (t{i}:{target} {{{values}}}) "
+            f"MERGE (n)-[:{relation_type}]->(t{i}) "
+            f"WITH n, row, t{i} "
+            f"OPTIONAL MATCH (n)-[old{i}:{relation_type}]->(other{i}:{target}) "
+            f"WHERE other{i} <> t{i} "
+            f"DELETE old{i}"
+        )
+    return statement
+
+
+@lru_cache(maxsize=None)
+def find_all_query(node_name: str, paged: bool = False, after: bool = False) -> str:
+    if not paged:
+        return f"MATCH (n:{node_name}) RETURN n"
+
+    keys = NODE_KEYS[node_name]
+    where = ""
+    if after:
+        # Keyset predicate over the node key, e.g. for (name, country):
+        # n.name >= $after0 AND (n.name > $after0 OR
+        #   (n.name = $after0 AND n.country > $after1))
+        # The leading range lets the planner seek the index on the first key.
+        branches = []
+        for i, key in enumerate(keys):
+            equals = [f"n.{k} = $after{j}" for j, k in enumerate(keys[:i])]
+            branches.append(" AND ".join(equals + [f"n.{key} > $after{i}"]))
+        keyset = " OR ".join(f"({branch})" for branch in branches)
+        where = f"WHERE n.{keys[0]} >= $after0 AND ({keyset}) "
+    order = ", ".join(f"n.{key}" for key in keys)
+    return (
+        f"MATCH (n:{node_name}) "
+        f"{where}"
+        f"RETURN n ORDER BY {order} LIMIT $limit"
+    )
+
+
+@lru_cache(maxsize=None)
+def filter_query(node_name: str, key: str, condition: str) -> str:
+    return (
+        f"MATCH (n:{node_name}) "
+        f"WHERE n.{key} {condition} $value "
+        f"RETURN n"
+    )
+
+
+@lru_cache(maxsize=None)
+def relation_query(node_1: str, relation_type: str, node_2: str, key: str, condition: str, value: str) -> str:
+    return (
+        f"MATCH (a:{node_1}) "
+        f"WITH a "
+        f"MATCH (b:{node_2}) "
+        f"WHERE a.{key} {condition} b.{value} "
+        f"MERGE (a)-[:{relation_type}]->(b)"
+    )
+
+
+@lru_cache(maxsize=None)
+def graph_query(country: bool = False, paged: bool = False, after: bool = False) -> str:
+    # One row per customer; its city, the city's country and its company
+    # come back as nested lists so the caller can deduplicate nodes.
+    conditions = []
+    if country:
+        conditions.append("cu.country = $country")
+    if after:
+        conditions.append("cu.customerID > $after")
+    where = f"WHERE {' AND '.join(conditions)} " if conditions else ""
+    page = "WITH cu ORDER BY cu.customerID LIMIT $limit " if paged else ""
+    return (
+        f"MATCH (cu:Customer) "
+        f"{where}"
+        f"{page}"
+        f"RETURN cu, "
+        f"[(cu)-[:LOCATED_IN]->(ci:City) | [ci, [(ci)-[:LOCATED_IN]->(co:Country) | co]]] AS cities, "
+        f"[(cu)-[:WORKS_IN]->(cm:Company) | cm] AS companies"
+    )
+
+
+@lru_cache(maxsize=1024)
+def filter_expression_query(node_name: str, where: str) -> str:
+    return (
+        f"MATCH (n:{node_name}) "
+        f"WHERE {where} "
+        f"RETURN n"
+    )
+
+
+def _key_map(node_name: str, variable: str = "id") -> str:
+    keys = NODE_KEYS[node_name]
+    if len(keys) == 1:
+        return f"{{{keys[0]}: {variable}}}"
+    return "{" + ", ".join(f"{key}: {variable}[{i}]" for i, key in enumerate(keys)) + "}"
+
+
+def _key_value(node_name: str, prefix: str = "n") -> str:
+    keys = NODE_KEYS[node_name]
+    if len(keys) == 1:
+        return f"{prefix}.{keys[0]}"
+    return "[" + ", ".join(f"{prefix}.{key}" for key in keys) + "]"
+
+
+@lru_cache(maxsize=None)
+def get_many_query(node_name: str) -> str:
+    return (
+        f"UNWIND $ids AS id "
+        f"MATCH (n:{node_name} {_key_map(node_name)}) "
+        f"RETURN id, n"
+    )
+
+
+@lru_cache(maxsize=None)
+def delete_many_query(node_name: str) -> str:
+    counter = count_property(node_name)
+    counts = ""
+    for i, aggregate in enumerate(NODE_AGGREGATES.get(node_name, ())):
+        known = _known("n", [field for _, field in aggregate[1]])
+        counts += _count_update(f"h{i}", aggregate, "n", counter, known, "- 1")
+    return (
+        f"UNWIND $ids AS id "
+        f"MATCH (n:{node_name} {_key_map(node_name)}) "
+        f"{counts}"
+        f"DETACH DELETE n"
+    )
+
+
+def _relation_types() -> str:
+    return "|".join(RELATIONS)
+
+
+@lru_cache(maxsize=None)
+def node_query(node_name: str) -> str:
+    return f"MATCH (n:{node_name} {_key_map(node_name, '$id')}) RETURN n"
+
+
+@lru_cache(maxsize=None)
+def expand_query() -> str:
+    # One hop from every frontier node, at most $fanout relationships each.
+    return (
+        f"UNWIND $frontier AS nid "
+        f"MATCH (a) WHERE id(a) = nid "
+        f"CALL {{ "
+        f"WITH a "
+        f"MATCH (a)-[r:{_relation_types()}]-(b) "
+        f"RETURN r, b LIMIT $fanout "
+        f"}} "
+        f"RETURN a, r, b"
+    )
+
+
+@lru_cache(maxsize=None)
+def shortest_path_query(node_name: str, max_length: int) -> str:
+    # Variable length bounds can't be parameters, so the capped length is
+    # part of the memoized text.
+    return (
+        f"MATCH (a:{node_name} {_key_map(node_name, '$source')}) "
+        f"MATCH (b:{node_name} {_key_map(node_name, '$target')}) "
+        f"MATCH p = shortestPath((a)-[:{_relation_types()}*..{int(max_length)}]-(b)) "
+        f"RETURN p"
+    )
+
+
+@lru_cache(maxsize=None)
+def top_groups_query(group: str, counter: str, limit: bool = False) -> str:
+    order = ", ".join(f"g.{key}" for key in NODE_KEYS[group])
+    page = " LIMIT $limit" if limit else ""
+    return (
+        f"MATCH (g:{group}) "
+        f"WHERE g.{counter} > 0 "
+        f"RETURN g ORDER BY g.{counter} DESC, {order}{page}"
+    )
+
+
+@lru_cache(maxsize=None)
+def rebuild_counts_queries(node_name: str) -> Tuple[str, ...]:
+    """
+    Returns statements that reset the counts of every group counting
+    ``node_name`` and recompute them with one scan of the label per group.
+    """
+    counter = count_property(node_name)
+    statements = []
+    for group, group_keys in NODE_AGGREGATES.get(node_name, ()):
+        fields = ", ".join(f"n.{field} AS k{i}" for i, (_, field) in enumerate(group_keys))
+        values = ", ".join(f"{key}: k{i}" for i, (key, _) in enumerate(group_keys))
+        statements.append(f"MATCH (g:{group}) SET g.{counter} = 0")
+        statements.append(
+            f"MATCH (n:{node_name}) "
+            f"WITH {fields}, count(*) AS total "
+            f"MATCH (g:{group} {{{values}}}) "
+            f"SET g.{counter} = total"
+        )
+    return tuple(statements)
+
+
+@lru_cache(maxsize=None)
+def property_map_query(node_name: str, key: str) -> str:
+    return f"MATCH (n:{node_name}) RETURN {_key_value(node_name)} AS id, n.{key} AS value"
+
@@ -1,14 +1,34 @@
+import functools
 import os
 import sys
+from typing import AsyncIterator
+from typing import Dict
+from typing import Iterable
 from typing import Optional
 from typing import List
+from typing import Type
 
 import dotenv
 
+from src.app.core.entities import CityEntity
+from src.app.core.entities import CompanyEntity
+from src.app.core.entities import CountryEntity
+from src.app.core.entities import CustomerEntity
 from src.app.core.entities import EnvItemEntity
+from src.app.core.entities import NodeEntity
+from src.app.core.entities import PageEntity
 from src.app.core.repositories import BaseReadOnlyRepository
 from src.app.core.repositories import BaseManageableRepository
 from src.app.infrastructure.databases import AbstractBaseDBClient
+from src.app.infrastructure.graphs import GraphBuilder
+from src.app.infrastructure.pagination import decode_cursor
+from src.app.infrastructure.pagination import entity_cursor
+from src.app.infrastructure.pagination import record_cursor
+from src.app.infrastructure.schema import NODE_KEYS
+from src.app.infrastructure.schema import linked_labels
+from src.app.infrastructure.singleflight import SingleFlight
+from src.app.infrastructure.singleflight import flight_key
+from src.app.infrastructure.versions import AbstractBaseVersionStore
 
 
 class EnvironRepository(BaseReadOnlyRepository):
@@ -30,59 +50,146 @@ class EnvironRepository(BaseReadOnlyRepository):
         pass
 
 
-class CustomersRepository(BaseManageableRepository):
+def coalesced(method):
+    """
+    Lets identical concurrent reads of a repository share one call: same
+    label, method and arguments while the first one is still running.
+    """
+    @functools.wraps(method)
+    async def wrapper(self, *args, **kwargs):
+        if self._flights is None:
+            return await method(self, *args, **kwargs)
+        key = flight_key(self.NODE_NAME, method.__name__, args, kwargs)
+        return await self._flights.do(key, lambda: method(self, *args, **kwargs))
+    return wrapper
 
-    NODE_NAME = "Customer"
-
-    def __init__(self, db: AbstractBaseDBClient):
-        self._db = db
-
-    @property
-    def db(self):
-        return self._db
-
-    async def get_all(self, limit: int = None, offset: int = None) -> List[EnvItemEntity]:
-        data = await self.db.select_all(self.NODE_NAME)
-        return data
 
-    async def filter(self, key: str, condition: str, value: str):
-        data = await self.db.filter(self.NODE_NAME, key, condition, value)
-        return data
+class NodeRepository(BaseManageableRepository):
 
-    async def insert(self, data: dict):
-        await self.db.insert(self.NODE_NAME, data)
+    NODE_NAME: str = None  # type: ignore
+    ENTITY: Type[NodeEntity] = None  # type: ignore
 
-    async def update(self, uuid: str, data: dict):
-        pass
-
-    async def delete(self, uuid: str):
-        pass
-
-    async def graph_view(self):
-        return await self.db.graph_view()
-
-
-class CountriesRepository(BaseManageableRepository):
-
-    NODE_NAME = "Country"
-
-    def __init__(self, db: AbstractBaseDBClient):
+    def __init__(self,
+                 db: AbstractBaseDBClient,
+                 versions: AbstractBaseVersionStore = None,
+                 flights: SingleFlight = None):
         self._db = db
+        self._versions = versions
+        self._flights = flights
 
     @property
     def db(self):
         return self._db
 
-    async def get_all(self, limit: int = None, offset: int = None) -> List[EnvItemEntity]:
-        data = await self.db.select_all(self.NODE_NAME)
-        return data
-
+    def _to_entities(self, records: Iterable) -> List[NodeEntity]:
+        from_properties = self.ENTITY.from_properties
+        return [from_properties(record[0]) for record in records]
+
+    async def _stream_entities(self) -> AsyncIterator[NodeEntity]:
+        from_properties = self.ENTITY.from_properties
+        async for record in self.db.stream_all(self.NODE_NAME):
+            yield from_properties(record[0])
+
+    async def _bump_version(self):
+        if self._versions is not None:
+            await self._versions.bump(*linked_labels(self.NODE_NAME))
+
+    async def get_all(self, limit: int = None, after: str = None, stream: bool = False) -> PageEntity:
+        if limit is None and stream:
+            # A stream is consumed once, so it is not shared here; for labels
+            # with a cache TTL it replays the cached list, which is.
+            return PageEntity(self._stream_entities())
+        return await self._get_page(limit, after)
+
+    @coalesced
+    async def _get_page(self, limit: int = None, after: str = None) -> PageEntity:
+        if limit is None:
+            data = await self.db.select_all(self.NODE_NAME)
+            return PageEntity(self._to_entities(data))
+
+        data = await self.db.select_all(
+            self.NODE_NAME, limit + 1, decode_cursor(self.NODE_NAME, after))
+        entities = self._to_entities(data[:limit])
+        if len(data) <= limit:
+            return PageEntity(entities)
+        return PageEntity(entities, entity_cursor(entities[-1]))
+
+    @coalesced
     async def filter(self, key: str, condition: str, value: str):
         data = await self.db.filter(self.NODE_NAME, key, condition, value)
+        return self._to_entities(data)
+
+    @coalesced
+    async def filter_by(self, expression: Dict):
+        data = await self.db.filter_by(self.NODE_NAME, expression)
+        return self._to_entities(data)
+
+    @coalesced
+    async def search(self, text: str, limit: int, mode: str) -> List[NodeEntity]:
+        """
+        Returns the nodes matching ``text`` in the label's full-text index,
+        most relevant first.
+        """
+        data = await self.db.search(self.NODE_NAME, text, limit, mode)
+        return self._to_entities(data)
+
+    @coalesced
+    async def get_many(self, ids: List) -> Dict:
+        """
+        Returns the nodes in the order of ``ids``, with ``None`` for every id
+        that has no node, and the missing ids.
+        """
+        single = len(NODE_KEYS[self.NODE_NAME]) == 1
+        from_properties = self.ENTITY.from_properties
+        records = await self.db.get_many(self.NODE_NAME, ids)
+        found = {}
+        for record in records:
+            key = record["id"] if single else tuple(record["id"])
+            found[key] = from_properties(record["n"])
+        items = []
+        missing = []
+        for item_id in ids:
+            node = found.get(item_id if single else tuple(item_id))
+            items.append(node)
+            if node is None:
+                missing.append(item_id)
+        return {"items": items, "missing": missing}
+
+    @coalesced
+    async def neighbors(self, key, depth: int, fanout: int, limit: int, timeout: float = None) -> Dict:
+        """
+        Returns the nodes and edges within ``depth`` hops of the node with
+        ``key``, as a graph payload; empty when there is no such node.
+        """
+        start, relationships = await self.db.neighbors(
+            self.NODE_NAME, key, depth, fanout, limit, timeout)
+        builder = GraphBuilder()
+        if start is not None:
+            builder.add_node(start)
+        for relationship in relationships:
+            builder.add_relationship(relationship)
+        return builder.build()
+
+    async def get_property_map(self, key: str) -> Dict:
+        data = await self.db.select_property_map(self.NODE_NAME, key)
         return data
 
+    @coalesced
+    async def get_counts(self, counted: str, limit: int = None) -> List[NodeEntity]:
+        """
+        Returns the groups of this label with at least one ``counted`` node,
+        largest first, from the counts kept on the group nodes.
+        """
+        data = await self.db.select_counts(self.NODE_NAME, counted, limit)
+        return self._to_entities(data)
+
     async def insert(self, data: dict):
         await self.db.insert(self.NODE_NAME, data)
+        await self._bump_version()
+
+    async def insert_many(self, data: List[dict]):
+        await self.db.insert_many(self.NODE_NAME, data)
+        await self._bump_version()
 
     async def update(self, uuid: str, data: dict):
         pass
@@ -90,60 +197,57 @@ class CountriesRepository(BaseManageableRepository):
     async def delete(self, uuid: str):
         pass
 
+    async def delete_many(self, ids: List):
+        await self.db.delete_many(self.NODE_NAME, ids)
+        await self._bump_version()
 
-class CitiesRepository(BaseManageableRepository):
-
-    NODE_NAME = "City"
+    async def rebuild_counts(self):
+        await self.db.rebuild_counts(self.NODE_NAME)
+        await self._bump_version()
 
-    def __init__(self, db: AbstractBaseDBClient):
-        self._db = db
 
-    @property
-    def db(self):
-        return self._db
+class CustomersRepository(NodeRepository):
 
-    async def get_all(self, limit: int = None, offset: int = None) -> List[EnvItemEntity]:
-        data = await self.db.select_all(self.NODE_NAME)
-        return data
+    NODE_NAME = "Customer"
+    ENTITY = CustomerEntity
+
+    @coalesced
+    async def graph_view(self, country: str = None, limit: int = None, after: str = None) -> PageEntity:
+        if limit is None:
+            data = await self.db.graph_view(country)
+            return PageEntity(GraphBuilder().add_all(data).build())
+
+        data = await self.db.graph_view(
+            country, limit + 1, decode_cursor(self.NODE_NAME, after))
+        cursor = None
+        if len(data) > limit:
+            data = data[:limit]
+            cursor = record_cursor(self.NODE_NAME, data[-1])
+        return PageEntity(GraphBuilder().add_all(data).build(), cursor)
+
+    @coalesced
+    async def shortest_path(self, source: str, target: str, max_length: int, timeout: float = None) -> Dict:
+        path = await self.db.shortest_path(self.NODE_NAME, source, target, max_length, timeout)
+        builder = GraphBuilder()
+        if path is not None:
+            for relationship in path.relationships:
+                builder.add_relationship(relationship)
+        return builder.build()
+
+
+class CountriesRepository(NodeRepository):
 
-    async def filter(self, key: str, condition: str, value: str):
-        data = await self.db.filter(self.NODE_NAME, key, condition, value)
-        return data
+    NODE_NAME = "Country"
+    ENTITY = CountryEntity
 
-    async def insert(self, data: dict):
-        await self.db.insert(self.NODE_NAME, data)
 
-    async def update(self, uuid: str, data: dict):
-        pass
+class CitiesRepository(NodeRepository):
 
-    async def delete(self, uuid: str):
-        pass
+    NODE_NAME = "City"
+    ENTITY = CityEntity
 
 
-class CompaniesRepository(BaseManageableRepository):
+class CompaniesRepository(NodeRepository):
 
     NODE_NAME = "Company"
-
-    def __init__(self, db: AbstractBaseDBClient):
-        self._db = db
-
-    @property
-    def db(self):
-        return self._db
-
-    async def get_all(self, limit: int = None, offset: int = None) -> List[EnvItemEntity]:
-        data = await self.db.select_all(self.NODE_NAME)
-        return data
-
-    async def filter(self, key: str, condition: str, value: str):
-        data = await self.db.filter(self.NODE_NAME, key, condition, value)
-        return data
-
-    async def insert(self, data: dict):
-        await self.db.insert(self.NODE_NAME, data)
-
-    async def update(self, uuid: str, data: dict):
-        pass
-
-    async def delete(self, uuid: str):
-        pass
+    ENTITY = CompanyEntity
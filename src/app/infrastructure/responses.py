@@ -1,19 +1,88 @@
-import json
-
 import typing
 from fastapi.responses import JSONResponse
+from fastapi.responses import Response
+from fastapi.responses import StreamingResponse
+
+from src.app.core.entities import PageEntity
+from .encoders import dumps
 
-from .encoders import ResponseEncoder
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+ETAG_HEADER = "ETag"
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
+STREAM_CHUNK_SIZE = 64 * 1024
 
 
 class JsonResponse(JSONResponse):
 
     def render(self, content: typing.Any) -> bytes:
-        return json.dumps(
-            content,
-            cls=ResponseEncoder,
-            ensure_ascii=False,
-            allow_nan=False,
-            indent=None,
-            separators=(",", ":"),
-        ).encode("utf-8")
+        return dumps(content)
+
+
+class NotModifiedResponse(Response):
+
+    def __init__(self, etag: str, **kwargs):
+        headers = dict(kwargs.pop("headers", None) or {})
+        headers[ETAG_HEADER] = etag
+        super().__init__(status_code=304, headers=headers, **kwargs)
+
+
+class PageJsonResponse(JsonResponse):
+
+    def __init__(self, page: PageEntity, **kwargs):
+        headers = dict(kwargs.pop("headers", None) or {})
+        if page.cursor:
+            headers[NEXT_CURSOR_HEADER] = page.cursor
+        super().__init__(content=page.items, headers=headers, **kwargs)
+
+
+class StreamingJsonResponse(StreamingResponse):
+    """
+    Writes the items of a (possibly async) iterable as a chunked JSON array,
+    or as newline delimited JSON, without holding the whole body in memory.
+    """
+
+    media_type = "application/json"
+
+    def __init__(self, content: typing.Any, ndjson: bool = False, **kwargs):
+        self._ndjson = ndjson
+        if ndjson:
+            kwargs.setdefault("media_type", NDJSON_MEDIA_TYPE)
+        super().__init__(self._encode(content), **kwargs)
+
+    @staticmethod
+    async def _iterate(content: typing.Any) -> typing.AsyncIterator:
+        if hasattr(content, "__aiter__"):
+            async for item in content:
+                yield item
+        else:
+            for item in content:
+                yield item
+
+    async def _encode(self, content: typing.Any) -> typing.AsyncIterator[bytes]:
+        prefix, separator, suffix = (b"", b"\n", b"\n") if self._ndjson else (b"[", b",", b"]")
+        buffer = [prefix]
+        size = 0
+        first = True
+        async for item in self._iterate(content):
+            if not first:
+                buffer.append(separator)
+            first = False
+            data = dumps(item)
+            buffer.append(data)
+            size += len(data)
+            if size >= STREAM_CHUNK_SIZE:
+                yield b"".join(buffer)
+                buffer = []
+                size = 0
+        if not (self._ndjson and first):
+            buffer.append(suffix)
+        yield b"".join(buffer)
+
+
+def page_response(page: PageEntity, ndjson: bool = False, **kwargs):
+    if not ndjson and not hasattr(page.items, "__aiter__"):
+        return PageJsonResponse(page, **kwargs)
+    headers = dict(kwargs.pop("headers", None) or {})
+    if page.cursor:
+        headers[NEXT_CURSOR_HEADER] = page.cursor
+    return StreamingJsonResponse(page.items, ndjson=ndjson, headers=headers, **kwargs)
@@ -0,0 +1,127 @@
+from typing import Dict
+from typing import Tuple
+
+NODE_PROPERTIES: Dict[str, Tuple[str, ...]] = {
+    "Customer": (
+        "customerID", "companyName", "contactName", "contactTitle", "address", "city",
+        "region", "postalCode", "country", "phone", "fax", "syncHash",
+    ),
+    "Country": ("name", "customerCount"),
+    "Company": ("name", "customerCount"),
+    "City": ("name", "country", "customerCount"),
+}
+
+# Properties stored as something other than strings, so that values from
+# query strings and paths can be converted before they are compared.
+PROPERTY_TYPES: Dict[str, Dict[str, type]] = {
+    "Country": {"customerCount": int},
+    "Company": {"customerCount": int},
+    "City": {"customerCount": int},
+}
+
+RELATIONS: Tuple[str, ...] = ("LOCATED_IN", "WORKS_IN")
+
+Link = Tuple[str, str, Tuple[Tuple[str, str], ...]]
+
+# Edges written together with their source node, as
+# (relation, target label, ((target key, source property), ...)).
+NODE_LINKS: Dict[str, Tuple[Link, ...]] = {
+    "Customer": (
+        ("LOCATED_IN", "City", (("name", "city"), ("country", "country"))),
+        ("WORKS_IN", "Company", (("name", "companyName"),)),
+    ),
+    "City": (
+        ("LOCATED_IN", "Country", (("name", "country"),)),
+    ),
+}
+
+Aggregate = Tuple[str, Tuple[Tuple[str, str], ...]]
+
+# Groups that keep a count of their source nodes, maintained by every write
+# of the source, as (group label, ((group key, source property), ...)).
+NODE_AGGREGATES: Dict[str, Tuple[Aggregate, ...]] = {
+    "Customer": (
+        ("Country", (("name", "country"),)),
+        ("City", (("name", "city"), ("country", "country"))),
+        ("Company", (("name", "companyName"),)),
+    ),
+}
+
+NODE_KEYS: Dict[str, Tuple[str, ...]] = {
+    "Customer": ("customerID",),
+    "Country": ("name",),
+    "Company": ("name",),
+    "City": ("name", "country"),
+}
+
+LOOKUP_INDEXES: Dict[str, Tuple[str, ...]] = {
+    "Customer": (
+        "companyName", "contactName", "contactTitle", "city", "region", "postalCode", "country",
+    ),
+    "City": ("name", "country"),
+}
+
+# Full-text indexes per label, searched by the search endpoints.
+SEARCH_INDEXES: Dict[str, Tuple[str, ...]] = {
+    "Customer": ("contactName", "companyName", "address", "city"),
+}
+
+
+def constraint_name(node_name: str, keys: Tuple[str, ...]) -> str:
+    return f"{node_name.lower()}_{'_'.join(keys).lower()}_key"
+
+
+def index_name(node_name: str, key: str) -> str:
+    return f"{node_name.lower()}_{key.lower()}_idx"
+
+
+def key_statements(node_name: str, keys: Tuple[str, ...]) -> Tuple[str, str]:
+    """
+    Returns the statement enforcing the node key and a fallback for servers
+    that reject it; composite NODE KEY constraints are enterprise only, so on
+    community edition a composite index is created instead.
+    """
+    name = constraint_name(node_name, keys)
+    props = ", ".join(f"n.{key}" for key in keys)
+    if len(keys) == 1:
+        statement = (
+            f"CREATE CONSTRAINT {name} IF NOT EXISTS "
+            f"FOR (n:{node_name}) REQUIRE {props} IS UNIQUE"
+        )
+        return statement, statement
+    return (
+        f"CREATE CONSTRAINT {name} IF NOT EXISTS "
+        f"FOR (n:{node_name}) REQUIRE ({props}) IS NODE KEY",
+        f"CREATE INDEX {name} IF NOT EXISTS FOR (n:{node_name}) ON ({props})",
+    )
+
+
+def index_statement(node_name: str, key: str) -> str:
+    return f"CREATE INDEX {index_name(node_name, key)} IF NOT EXISTS FOR (n:{node_name}) ON (n.{key})"
+
+
+def search_index_name(node_name: str) -> str:
+    return f"{node_name.lower()}_search"
+
+
+def search_index_statement(node_name: str, keys: Tuple[str, ...]) -> str:
+    props = ", ".join(f"n.{key}" for key in keys)
+    return (
+        f"CREATE FULLTEXT INDEX {search_index_name(node_name)} IF NOT EXISTS "
+        f"FOR (n:{node_name}) ON EACH [{props}]"
+    )
+
+
+def count_property(node_name: str) -> str:
+    return f"{node_name[0].lower()}{node_name[1:]}Count"
+
+
+def linked_labels(node_name: str) -> Tuple[str, ...]:
+    """
+    Returns the label and the labels a write to it can change as well: its
+    ``NODE_LINKS`` targets and the groups counting it.
+    """
+    labels = [node_name]
+    labels.extend(target for _, target, _ in NODE_LINKS.get(node_name, ()))
+    labels.extend(group for group, _ in NODE_AGGREGATES.get(node_name, ()))
+    return tuple(dict.fromkeys(labels))
@@ -0,0 +1,52 @@
+"""
+Coalescing of identical concurrent calls.
+
+While a call for a key is in flight, callers asking for the same key wait for
+it instead of starting their own, and all of them get its result or its
+exception. Nothing is kept once the call completes, so this only flattens
+bursts; keeping results around is the job of the result cache.
+"""
+
+import asyncio
+import json
+from typing import Any
+from typing import Awaitable
+from typing import Callable
+from typing import Dict
+
+from src.app.infrastructure import metrics
+
+
+def flight_key(*parts) -> str:
+    return json.dumps(parts, sort_keys=True, ensure_ascii=False, default=str)
+
+
+class SingleFlight:
+    """
+    The call runs in a task of its own, so a caller that goes away (a client
+    disconnecting) does not cancel it for the others still waiting.
+    """
+
+    def __init__(self, scope: str):
+        self.scope = scope
+        self._calls: Dict[str, asyncio.Future] = {}
+
+    @property
+    def in_flight(self) -> int:
+        return len(self._calls)
+
+    async def do(self, key: str, call: Callable[[], Awaitable]) -> Any:
+        future = self._calls.get(key)
+        if future is None:
+            future = asyncio.ensure_future(call())
+            self._calls[key] = future
+            future.add_done_callback(lambda done: self._forget(key, done))
+        else:
+            metrics.COALESCED_CALLS.inc(self.scope)
+        return await asyncio.shield(future)
+
+    def _forget(self, key: str, future: asyncio.Future):
+        if self._calls.get(key) is future:
+            del self._calls[key]
+        if not future.cancelled():
+            future.exception()  # retrieved, even when every caller has gone
@@ -0,0 +1,183 @@
+import json
+import logging
+import random
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any
+from typing import Callable
+from typing import Dict
+from typing import List
+from typing import Optional
+from typing import Tuple
+
+from src.app.infrastructure.exceptions import AppException
+
+PLAN_NONE = "none"
+PLAN_EXPLAIN = "explain"
+PLAN_PROFILE = "profile"
+PLAN_MODES = (PLAN_NONE, PLAN_EXPLAIN, PLAN_PROFILE)
+
+# Operators that usually mean a missing index or an unbounded match.
+SUSPECT_OPERATORS = ("AllNodesScan", "NodeByLabelScan", "CartesianProduct", "Eager")
+
+MAX_STATEMENTS = 10
+MAX_PLANNED = 3
+MAX_PENDING_PLANS = 10
+
+logger = logging.getLogger("neo4j_fastapi.slow_queries")
+
+Statement = Tuple[str, Dict]
+
+
+def parameter_shape(value: Any) -> Any:
+    """
+    Describes a parameter by type and size only, so that customer data never
+    reaches the log.
+    """
+    if isinstance(value, dict):
+        return {key: parameter_shape(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        inner = parameter_shape(value[0]) if value else None
+        return {"list": len(value), "of": inner} if inner is not None else {"list": len(value)}
+    if value is None:
+        return "null"
+    return type(value).__name__
+
+
+class RecordingTransaction:
+    """
+    Wraps a driver transaction and keeps the statements run through it, so
+    that a slow transaction function can be logged with what it sent.
+    """
+
+    def __init__(self, tx, statements: List[Statement]):
+        self._tx = tx
+        self._statements = statements
+
+    def run(self, query: str, parameters: Dict = None, **kwparameters):
+        if len(self._statements) < MAX_STATEMENTS:
+            self._statements.append((query, dict(parameters or {}, **kwparameters)))
+        return self._tx.run(query, parameters, **kwparameters)
+
+    def __getattr__(self, name):
+        return getattr(self._tx, name)
+
+
+def _walk_plan(plan: Dict, operators: List[str]) -> int:
+    operators.append(plan.get("operatorType", ""))
+    hits = plan.get("dbHits", 0) or 0
+    for child in plan.get("children", ()):
+        hits += _walk_plan(child, operators)
+    return hits
+
+
+def summarize_plan(plan: Dict) -> Dict:
+    operators: List[str] = []
+    hits = _walk_plan(plan, operators)
+    summary = {
+        "operators": operators,
+        "suspect": sorted({
+            operator for operator in operators
+            if operator.split("@")[0] in SUSPECT_OPERATORS
+        }),
+    }
+    if "dbHits" in plan:
+        summary["db_hits"] = hits
+    return summary
+
+
+class SlowQueryLog:
+    """
+    Logs transactions that take longer than ``threshold`` seconds as one JSON
+    object per line: operation, duration, rows and every statement with the
+    shape of its parameters. A ``sample_rate`` share of them also gets the
+    query plan, from EXPLAIN or, for reads only, from PROFILE, which runs the
+    statement again. Writes are never profiled.
+
+    Plans are captured on a thread of their own and their entries logged
+    from there, so the request that was slow doesn't wait for them; while
+    ``MAX_PENDING_PLANS`` are waiting, further entries are logged without.
+    """
+
+    def __init__(self,
+                 threshold: float,
+                 plan: str = PLAN_NONE,
+                 sample_rate: float = 0.0,
+                 log: logging.Logger = logger):
+        if plan not in PLAN_MODES:
+            raise AppException(f"Unknown slow query plan mode {plan}")
+        self.threshold = threshold
+        self.plan = plan
+        self.sample_rate = sample_rate
+        self._log = log
+        self._planner: Optional[ThreadPoolExecutor] = None
+        self._pending = 0
+        self._lock = threading.Lock()
+
+    def is_slow(self, duration: float) -> bool:
+        return 0 < self.threshold <= duration
+
+    def record(self,
+               operation: str,
+               access: str,
+               duration: float,
+               rows: Optional[int],
+               statements: List[Statement],
+               run_plan: Callable[[str, str, Dict], Dict] = None):
+        """
+        Logs one slow operation; ``run_plan(prefix, query, params)`` runs a
+        statement prefixed with EXPLAIN or PROFILE and returns its plan, in
+        the background.
+        """
+        entry = {
+            "operation": operation,
+            "access": access,
+            "duration": round(duration, 6),
+            "rows": rows,
+            "statements": [
+                {"query": query, "parameters": parameter_shape(params)}
+                for query, params in statements
+            ],
+        }
+        if run_plan is not None and self._sampled() and self._reserve():
+            self.planner.submit(self._record_planned, entry, access, list(statements), run_plan)
+            return
+        self._log.warning(json.dumps(entry, default=str))
+
+    @property
+    def planner(self) -> ThreadPoolExecutor:
+        if self._planner is None:
+            self._planner = ThreadPoolExecutor(max_workers=1, thread_name_prefix="slow-query-plan")
+        return self._planner
+
+    def close(self, wait: bool = False):
+        if self._planner is not None:
+            self._planner.shutdown(wait=wait)
+            self._planner = None
+
+    def _reserve(self) -> bool:
+        with self._lock:
+            if self._pending >= MAX_PENDING_PLANS:
+                return False
+            self._pending += 1
+            return True
+
+    def _record_planned(self, entry: Dict, access: str, statements: List[Statement], run_plan: Callable):
+        try:
+            mode = PLAN_PROFILE if self.plan == PLAN_PROFILE and access == "read" else PLAN_EXPLAIN
+            planned = set()
+            for item, (query, params) in zip(entry["statements"], statements):
+                if query in planned or len(planned) >= MAX_PLANNED:
+                    continue
+                planned.add(query)
+                try:
+                    item[mode] = summarize_plan(run_plan(mode.upper(), query, params))
+                except Exception as error:  # the plan is best effort
+                    item[mode] = {"error": str(error)}
+            self._log.warning(json.dumps(entry, default=str))
+        finally:
+            with self._lock:
+                self._pending -= 1
+
+    def _sampled(self) -> bool:
+        return self.plan != PLAN_NONE and random.random() < self.sample_rate
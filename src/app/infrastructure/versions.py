@@ -0,0 +1,105 @@
+import json
+import os
+import uuid
+from abc import ABCMeta
+from abc import abstractmethod
+from typing import Dict
+from typing import Optional
+from typing import Tuple
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover
+    fcntl = None
+
+
+def new_version() -> str:
+    return uuid.uuid4().hex
+
+
+class AbstractBaseVersionStore(metaclass=ABCMeta):
+    """
+    Holds an opaque data version per node label that changes on every write
+    to the label. Reading it never touches the database, so it can back
+    ETags and cache keys.
+    """
+
+    @abstractmethod
+    async def get(self, label: str) -> str:
+        raise NotImplementedError
+
+    @abstractmethod
+    async def bump(self, *labels: str):
+        raise NotImplementedError
+
+
+class InMemoryVersionStore(AbstractBaseVersionStore):
+
+    def __init__(self):
+        self._versions: Dict[str, str] = {}
+
+    async def get(self, label: str) -> str:
+        return self._versions.setdefault(label, new_version())
+
+    async def bump(self, *labels: str):
+        for label in labels:
+            self._versions[label] = new_version()
+
+
+class FileVersionStore(AbstractBaseVersionStore):
+    """
+    Keeps the versions in a JSON file, so that a synchronization run from the
+    command line is seen by the API processes on the same host. Reads only
+    stat the file until it is replaced.
+    """
+
+    def __init__(self, path: str):
+        self._path = path
+        self._lock_path = f"{path}.lock"
+        self._stat: Optional[Tuple[int, int, int]] = None
+        self._versions: Dict[str, str] = {}
+
+    async def get(self, label: str) -> str:
+        self._refresh()
+        version = self._versions.get(label)
+        if version is None:
+            self._update((label,), only_missing=True)
+            version = self._versions[label]
+        return version
+
+    async def bump(self, *labels: str):
+        self._update(labels)
+
+    def _refresh(self):
+        try:
+            stat = os.stat(self._path)
+        except FileNotFoundError:
+            self._stat, self._versions = None, {}
+            return
+        # The file is always replaced, never rewritten, so a new inode means
+        # new content even within one mtime tick.
+        key = (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+        if key != self._stat:
+            self._stat, self._versions = key, self._read()
+
+    def _read(self) -> Dict[str, str]:
+        try:
+            with open(self._path) as versions_file:
+                return json.load(versions_file)
+        except (FileNotFoundError, ValueError):
+            return {}
+
+    def _update(self, labels: Tuple[str, ...], only_missing: bool = False):
+        with open(self._lock_path, "a") as lock:
+            if fcntl is not None:
+                fcntl.flock(lock, fcntl.LOCK_EX)
+            versions = self._read()
+            for label in labels:
+                if not (only_missing and label in versions):
+                    versions[label] = new_version()
+            temp_path = f"{self._path}.{os.getpid()}.tmp"
+            with open(temp_path, "w") as versions_file:
+                json.dump(versions, versions_file)
+            os.replace(temp_path, self._path)
+        self._stat = None
+        self._refresh()